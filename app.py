@@ -1,19 +1,20 @@
-import base64
-import io
 import uuid
-from textwrap import wrap
 
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import numpy as np
-import pandas as pd
-import plotly.graph_objs as go
-from dash.dependencies import Input, Output, State
-from flask_caching import Cache
-from src.graph import get_graph
-from src.visualize_graph import plot_G
-from src.markdown_info import get_markdown_info
+import dash_table
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+from flask import jsonify
+from flask_compress import Compress
+from src.analyse_data import ANALYTICS_TABLES, get_analytics
+from src.figure_cache import cache, get_cache_stats, get_cached_geometry, get_cached_marker, get_cached_selection
+from src.graph import PLOT_FIELDS
+from src.metrics import init_app as init_metrics, timed
+from src.query import get_query, get_query_index, get_year_bounds
+from src.reload import get_live_graph
+from src.visualize_graph import get_algo_positions, get_figure_base, get_viewport, use_lod
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']  #, "https://codepen.io/chriddyp/pen/brPBPO.css"]  # dash and loading spinner css
 
@@ -23,27 +24,71 @@ mck_palette = ['#034B6F', '#8C5AC8', '#E6A0C8', '#E5546C', '#FAA082', '#AFC3FF',
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 server = app.server
-cache = Cache(app.server, config={
-    'CACHE_TYPE': 'redis',
-    # Note that filesystem cache doesn't work on systems with ephemeral
-    # filesystems like Heroku.
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory',
+cache.init_app(server)
+init_metrics(server)
+# registered after the metrics hooks so that they record the compressed response sizes
+Compress(server)
 
-    # should be equal to maximum number of users on the app at a single time
-    # higher numbers will store more data in the filesystem / redis cache
-    'CACHE_THRESHOLD': 200
-})
 
-G = get_graph()
-fields = ['imdb', 'tomato', 'Jump Scares', 'Major Jump Scares', 'Minor Jump Scares', 'Runtime', 'Scare Rating', 'is_instance']
+@server.route('/cache-stats')
+def cache_stats():
+    return jsonify(get_cache_stats())
+
+
+# the graph is loaded on first use rather than at import, so gunicorn can load it once in the
+# master (see gunicorn.conf.py) and the workers share it copy-on-write. Afterwards it is reloaded
+# in the background when the data changes, and each page keeps using the version it was served
+# with (the version in its figure-base store) while that version is still kept.
+fields = PLOT_FIELDS
+VERSION_TRIGGERS = ['dim0.value', 'dim1.value', 'main-graph.clickData', 'node_input.value']
+
+
+def get_G(version=None):
+    return get_live_graph(version, warm_graph)
+
+
+def warm_graph(G):
+    # everything a first request would otherwise compute, done before the graph goes live
+    get_algo_positions(G)
+    get_query_index(G)
+    with server.app_context():
+        get_cached_geometry(G, None, None)
+        get_cached_marker(G, 'imdb', 'is_instance')
+        get_cached_selection(G, None)
+    get_analytics()
+
+
+def get_version(figure_base):
+    return (figure_base or {}).get('version')
+
+
+def get_page_G(figure_base):
+    # the marker and selection are indexed like the page's figure base, so they are not sent for
+    # another version. update_geometry moves the page to the live graph and the new figure base
+    # then triggers them again.
+    G = get_G(get_version(figure_base))
+    if G.graph['version'] != get_version(figure_base):
+        raise PreventUpdate
+    return G
+
+
+def get_nodes_of_type(G, node_type):
+    # from the attribute table, so serving a page does not assemble every node's attributes
+    nodes = sorted(node for node, is_type in zip(G.graph['nodes'], G.graph['table']['is_instance'] == node_type) if is_type)
+    return nodes
 
 
 def serve_layout():
+    G = get_G()
+    year_bounds = get_year_bounds(G)
     session_id = str(uuid.uuid4())
     return html.Div([
         html.Div([
         html.Div(session_id, id='session-id', style={'display': 'none'}),
+        dcc.Store(id='figure-base', data=get_figure_base(G)),
+        dcc.Store(id='geometry'),
+        dcc.Store(id='marker'),
+        dcc.Store(id='selection'),
         html.Div([
             dcc.Graph(id='main-graph',style={'height': '98vh'}),
         ],
@@ -91,23 +136,140 @@ def serve_layout():
                             id='dim3',
                         )
                         ]),
+            html.Label(['Year:',
+                        dcc.RangeSlider(
+                            id='year_range',
+                            min=year_bounds[0],
+                            max=year_bounds[1],
+                            value=list(year_bounds),
+                            marks={year: str(year) for year in range(year_bounds[0] - year_bounds[0] % 10 + 10, year_bounds[1] + 1, 10)}
+                        )
+                        ]),
+            html.Label(['Tags:',
+                        dcc.Dropdown(
+                            options=[{'label': node, 'value': node} for node in get_nodes_of_type(G, 'tag')],
+                            multi=True,
+                            id='tag_filter'
+                        )
+                        ]),
+            html.Label(['Directors:',
+                        dcc.Dropdown(
+                            options=[{'label': node, 'value': node} for node in get_nodes_of_type(G, 'person')],
+                            multi=True,
+                            id='director_filter'
+                        )
+                        ]),
+            html.Label(['Min imdb:',
+                        dcc.Slider(id='min_imdb', min=0, max=10, step=0.5, value=0, marks={score: str(score) for score in range(0, 11, 2)})
+                        ]),
+            html.Label(['Min tomato:',
+                        dcc.Slider(id='min_tomato', min=0, max=100, step=5, value=0, marks={score: str(score) for score in range(0, 101, 20)})
+                        ]),
+            html.Label(['Min scare rating:',
+                        dcc.Slider(id='min_scare', min=0, max=5, step=0.5, value=0, marks={score: str(score) for score in range(0, 6)})
+                        ]),
+            html.Label(['Netflix (US):',
+                        dcc.RadioItems(
+                            options=[{'label': option, 'value': option} for option in ['any', 'yes', 'no']],
+                            id='netflix',
+                            value='any',
+                            labelStyle={'display': 'inline-block'}
+                        )
+                        ]),
+            html.Label(['Render:',
+                        dcc.RadioItems(
+                            options=[{'label': mode, 'value': mode} for mode in ['auto', 'svg', 'webgl']],
+                            id='render',
+                            value='auto',
+                            labelStyle={'display': 'inline-block'}
+                        )
+                        ]),
             dcc.Markdown(id='markdown_info', style={"white-space": "pre", "overflow-x": "scroll", "overflow-y": "scroll"}),
+            html.Label(['Analytics:',
+                        dcc.Dropdown(
+                            options=[{'label': name.replace('_', ' '), 'value': name} for name in ANALYTICS_TABLES],
+                            id='analytics_table',
+                            value='netflix_effect'
+                        )
+                        ]),
+            dash_table.DataTable(
+                id='analytics',
+                page_size=15,
+                sort_action='native',
+                style_table={'overflowX': 'scroll'},
+                style_cell={'backgroundColor': 'black', 'color': 'white'}
+            ),
         ], className='three columns', style={'height': '98vh'})
     ], className='row')
 
 app.layout = serve_layout
 
 
+app.clientside_callback(
+    ClientsideFunction(namespace='graph', function_name='assemble_figure'),
+    Output('main-graph', 'figure'),
+    [Input('geometry', 'data'),
+     Input('marker', 'data'),
+     Input('selection', 'data')],
+    [State('figure-base', 'data')])
+
+
 @app.callback(
-    [Output('main-graph', 'figure'),
+    [Output('geometry', 'data'),
+     Output('figure-base', 'data')],
+    [Input('dim2', 'value'),
+     Input('dim3', 'value'),
+     Input('main-graph', 'relayoutData'),
+     Input('render', 'value'),
+     Input('year_range', 'value'),
+     Input('tag_filter', 'value'),
+     Input('director_filter', 'value'),
+     Input('min_imdb', 'value'),
+     Input('min_tomato', 'value'),
+     Input('min_scare', 'value'),
+     Input('netflix', 'value'),
+     Input('dim0', 'value'),
+     Input('dim1', 'value'),
+     Input('main-graph', 'clickData'),
+     Input('node_input', 'value')],
+    [State('figure-base', 'data')])
+@timed('update_geometry')
+def update_geometry(dim2, dim3, relayout_data, render, year_range, tags, directors, min_imdb, min_tomato, min_scare, netflix, dim0, dim1, click_data, node_input, figure_base):
+    G = get_G(get_version(figure_base))
+    triggers = [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    if triggers == ['main-graph.relayoutData'] and not use_lod(G, render):
+        raise PreventUpdate
+    # the marker and selection inputs only come here to move a page off an evicted version
+    if set(triggers) <= set(VERSION_TRIGGERS) and G.graph['version'] == get_version(figure_base):
+        raise PreventUpdate
+    query = get_query(G, year_range, tags, directors, min_imdb, min_tomato, min_scare, netflix)
+    geometry = get_cached_geometry(G, dim2, dim3, get_viewport(relayout_data), render, query)
+    # a page whose version is no longer kept moves to the live graph, the new figure base then
+    # refreshes its marker and selection as well
+    if G.graph['version'] != get_version(figure_base):
+        return [geometry, get_figure_base(G)]
+    return [geometry, dash.no_update]
+
+
+@app.callback(
+    Output('marker', 'data'),
+    [Input('dim0', 'value'),
+     Input('dim1', 'value'),
+     Input('figure-base', 'data')])
+@timed('update_marker')
+def update_marker(dim0, dim1, figure_base):
+    return get_cached_marker(get_page_G(figure_base), dim0, dim1)
+
+
+@app.callback(
+    [Output('selection', 'data'),
      Output('markdown_info', 'children')],
     [Input('main-graph', 'clickData'),
      Input('node_input', 'value'),
-     Input('dim0', 'value'),
-     Input('dim1', 'value'),
-     Input('dim2', 'value'),
-     Input('dim3', 'value')])
-def update_graph(click_data, node_input, dim0, dim1, dim2, dim3):
+     Input('figure-base', 'data')])
+@timed('update_selection')
+def update_selection(click_data, node_input, figure_base):
+    G = get_page_G(figure_base)
     ctx = dash.callback_context
     if not ctx.triggered:
         node = None
@@ -116,21 +278,26 @@ def update_graph(click_data, node_input, dim0, dim1, dim2, dim3):
         if trigger == 'node_input.value':
             node = node_input
         elif trigger == 'main-graph.clickData':
-            node = click_data['points'][0]['text']
+            node = click_data['points'][0].get('text')
         else:
             node = None
 
-    if node in ['tag', 'director', 'movie']:  # Plotly bug?
+    if node not in G:  # clicks on edges carry no node
         node = None
-    if dim2 is None or dim3 is None:
-        dims = [dim0, dim1]
-    else:
-        dims = [dim0, dim1, dim2, dim3]
-    fig = plot_G(G, dims, node, auto_open=False)
-    fig.update_layout({'uirevision': True})
-    markdown_info = get_markdown_info(G, node)
-    # print(fig)
-    return [fig, markdown_info]
+    selection, markdown_info = get_cached_selection(G, node)
+    return [selection, markdown_info]
+
+
+@app.callback(
+    [Output('analytics', 'data'),
+     Output('analytics', 'columns')],
+    [Input('analytics_table', 'value')])
+@timed('update_analytics')
+def update_analytics(name):
+    if name not in ANALYTICS_TABLES:
+        raise PreventUpdate
+    table = get_analytics()[name].round(3)
+    return [table.to_dict('records'), [{'name': column, 'id': column} for column in table.columns]]
 
 
 if __name__ == '__main__':
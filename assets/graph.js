@@ -0,0 +1,91 @@
+// numeric arrays arrive as {dtype, shape, data} with little-endian base64 data, see src/payload.py
+var decode = function(value) {
+    if (!value || value.dtype === undefined) {
+        return value;
+    }
+    var binary = atob(value.data);
+    var bytes = new Uint8Array(binary.length);
+    for (var i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return value.dtype === 'int32' ? new Int32Array(bytes.buffer) : new Float32Array(bytes.buffer);
+};
+
+var is_array = function(values) {
+    return Array.isArray(values) || ArrayBuffer.isView(values);
+};
+
+// plotly labels the points of a line, so each edge's label goes on its two ends and its gap
+var edge_text = function(codes, labels) {
+    var text = [];
+    for (var i = 0; i < codes.length; i++) {
+        var label = labels[codes[i]] || '';
+        text.push(label, label, label);
+    }
+    return text;
+};
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    graph: {
+        assemble_figure: function(geometry, marker, selection, figure_base) {
+            if (!geometry || !marker || !figure_base) {
+                return {data: [], layout: {}};
+            }
+            var nodes = Array.from(decode(geometry.nodes));
+            var x = decode(geometry.x);
+            var y = decode(geometry.y);
+            var trace_type = geometry.webgl ? 'scattergl' : 'scatter';
+            var pick = function(values) {
+                values = decode(values);
+                return is_array(values) ? nodes.map(function(id) { return values[id]; }) : values;
+            };
+            var edge_x = decode(geometry.edge_x);
+            var edge_y = decode(geometry.edge_y);
+            var labels = figure_base.connection_labels || [];
+            // bundled level-of-detail edges have no connection and no hover text
+            var edge_codes = geometry.edge_connections ? decode(geometry.edge_connections) : null;
+            var edge_width = 0.5;
+            var opacity = figure_base.marker.opacity;
+            if (selection) {
+                var positions = {};
+                nodes.forEach(function(id, i) { positions[id] = i; });
+                var selected = new Set(decode(selection.nodes));
+                var edges = decode(selection.edges);
+                var connections = decode(selection.connections);
+                opacity = nodes.map(function(id) { return selected.has(id) ? 0.8 : 0.1; });
+                edge_x = [];
+                edge_y = [];
+                edge_codes = [];
+                for (var i = 0; i < edges.length; i += 2) {
+                    var a = positions[edges[i]];
+                    var b = positions[edges[i + 1]];
+                    if (a === undefined || b === undefined) {
+                        continue;
+                    }
+                    edge_x.push(x[a], x[b], null);
+                    edge_y.push(y[a], y[b], null);
+                    edge_codes.push(connections[i / 2]);
+                }
+                edge_width = 0.9;
+            }
+            var node_marker = Object.assign({}, figure_base.marker, {
+                size: pick(marker.size !== undefined ? marker.size : figure_base.marker.size),
+                color: pick(marker.color !== undefined ? marker.color : figure_base.marker.color),
+                opacity: opacity
+            });
+            var data = [
+                {type: trace_type, mode: 'lines', x: edge_x, y: edge_y,
+                 text: edge_codes ? edge_text(edge_codes, labels) : undefined, hoverinfo: edge_codes ? 'text' : 'none',
+                 line: {width: edge_width, color: '#cccccc'}},
+                {type: trace_type, mode: 'markers', x: x, y: y,
+                 text: pick(figure_base.labels), hoverinfo: 'text', marker: node_marker}
+            ];
+            if (geometry.clusters) {
+                data.push({type: trace_type, mode: 'markers', x: decode(geometry.clusters.x), y: decode(geometry.clusters.y),
+                           text: geometry.clusters.text, hoverinfo: 'text',
+                           marker: {size: decode(geometry.clusters.size), color: '#AFC3FF', opacity: 0.5}});
+            }
+            return {data: data, layout: figure_base.layout};
+        }
+    }
+});
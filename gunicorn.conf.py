@@ -0,0 +1,14 @@
+# import the app in the master and load the graph before forking, so the workers share the
+# mmapped artifact and the graph object instead of each building their own
+preload_app = True
+
+
+def when_ready(server):
+    from app import get_G
+    get_G()
+
+
+def post_fork(server, worker):
+    # no-op after a preloaded start, loads the graph when preload_app is switched off
+    from app import get_G
+    get_G()
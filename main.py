@@ -1,27 +1,146 @@
 import fire
-from src.graph import get_graph
-from src.visualize_graph import plot_G
-from src.scrape import get_main_page, get_main_table, save_jumpscares, get_links, get_detailed_data, save_data_details, add_jump_ratings
 
+# heavy modules (pandas, networkx, plotly, pyarrow) are imported inside each subcommand so that
+# starting one of them only pays for what it uses, see bench_import
 
-def scrape_data():
-    soup = get_main_page()
+
+def scrape_data(workers=1, rate=None, retries=3, backoff=0.5, main_url=None, incremental=False, recheck=False):
+    from src.scrape import get_main_page, get_main_table, save_jumpscares, get_links, scrape_to_store, save_data_details, add_jump_ratings, get_site, MAIN_PAGE, get_incremental_data, load_data_details
+    main_url = main_url or MAIN_PAGE
+    soup = get_main_page(main_url)
     jumpscares = get_main_table(soup)
-    good_links = get_links(soup)
+    good_links = get_links(soup, get_site(main_url))
     jumpscares['link'] = good_links
     save_jumpscares(jumpscares)
-    data_details = get_detailed_data(good_links)
+    if incremental:
+        data_details = get_incremental_data(good_links, load_data_details(), recheck, workers, rate, retries, backoff)
+        data_details = add_jump_ratings(data_details, jumpscares)
+        save_data_details(data_details)
+        convert_data()
+    else:
+        scrape_to_store(good_links, jumpscares, workers, rate, retries, backoff)
+
+
+def parse_data(workers=4):
+    import pandas as pd
+    from src.scrape import save_data_details, add_jump_ratings, parse_stored_pages
+    jumpscares = pd.read_csv('data/jumpscares.csv')
+    data_details = parse_stored_pages(jumpscares['link'].to_list(), workers)
     data_details = add_jump_ratings(data_details, jumpscares)
     save_data_details(data_details)
+    convert_data()
+
+
+def convert_data(batch_size=100):
+    from src.graph import load_details, get_store_batches
+    from src.storage import write_store
+    write_store(get_store_batches(load_details(), batch_size))
+
+
+def build_graph_artifact():
+    from src.graph import build_graph
+    from src.graph_store import save_graph_artifact
+    G = build_graph()
+    save_graph_artifact(G)
+
+
+def build_layouts(methods=None):
+    from src.graph import get_graph
+    from src.layout import build_layout, get_layout_method
+    G = get_graph()
+    for method in methods or [get_layout_method(G)]:
+        build_layout(G, method)
+
+
+def warm_figure_cache():
+    from flask import Flask
+    from src.figure_cache import cache, warm_cache
+    from src.graph import get_graph, PLOT_FIELDS
+    server = Flask(__name__)
+    cache.init_app(server)
+    with server.app_context():
+        warm_cache(get_graph(), PLOT_FIELDS)
 
 
-def graph():
+def graph(min_year=None, max_year=None, tags=None, directors=None, min_imdb=None, min_tomato=None, min_scare=None, netflix=None):
+    from src.graph import get_graph
+    from src.query import get_query
+    from src.visualize_graph import plot_G
     G = get_graph()
-    plot_G(G)
+    plot_G(G, query=get_query(G, (min_year, max_year), tags, directors, min_imdb, min_tomato, min_scare, netflix))
+
+
+def export(specs='all', workers=4, formats=('html', 'json'), path=None):
+    from src.export import export_views, EXPORT_DIR
+    from src.graph import get_graph
+    export_views(get_graph(), specs, workers, formats, path or EXPORT_DIR)
+
+
+def analyse(table=None, rows=20):
+    from src.analyse_data import ANALYTICS_TABLES, get_analytics
+    if table is None:
+        print('tables: ' + ', '.join(ANALYTICS_TABLES))
+        return
+    print(get_analytics()[table].head(rows).to_string())
+
+
+def bench_parse(workers=4):
+    from src import benchmark
+    benchmark.bench_parse(workers)
+
+
+def bench_average_scores(n_movies=100000):
+    from src import benchmark
+    benchmark.bench_average_scores(n_movies)
+
+
+def bench_edge_trace(n_edges=100000, n_nodes=None, seed=0):
+    from src import benchmark
+    benchmark.bench_edge_trace(n_edges, n_nodes, seed)
+
+
+def bench_timeline(n_movies=100000):
+    from src import benchmark
+    benchmark.bench_timeline(n_movies)
+
+
+def bench_pipeline(sizes=(1000, 10000, 100000), method='fast', memory=True, output=None, baseline=None):
+    from src import benchmark
+    benchmark.bench_pipeline(sizes, method, memory, output, baseline)
+
+
+def bench_payloads(n_movies=10000, dims=('imdb', 'Runtime')):
+    from src import benchmark
+    benchmark.bench_payloads(n_movies, dims)
+
+
+def bench_load(n_movies=100000):
+    from src import benchmark
+    benchmark.bench_load(n_movies)
+
+
+def bench_import(module='main', budget=None, top=10):
+    from src import benchmark
+    benchmark.bench_import(module, budget, top)
 
 
 if __name__ == '__main__':
     fire.Fire({
         'graph': graph,
-        'scrape_data': scrape_data
+        'build_graph': build_graph_artifact,
+        'build_layout': build_layouts,
+        'warm_cache': warm_figure_cache,
+        'scrape_data': scrape_data,
+        'parse_data': parse_data,
+        'convert_data': convert_data,
+        'export': export,
+        'analyse': analyse,
+        'bench_parse': bench_parse,
+        'bench_average_scores': bench_average_scores,
+        'bench_edge_trace': bench_edge_trace,
+        'bench_timeline': bench_timeline,
+        'bench_pipeline': bench_pipeline,
+        'bench_payloads': bench_payloads,
+        'bench_load': bench_load,
+        'bench_import': bench_import
     })
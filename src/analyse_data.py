@@ -1,2 +1,154 @@
+import hashlib
+import os
+import shutil
+import numpy as np
 import pandas as pd
-jumpscares = pd.read_csv('data/jumpscares.csv')
\ No newline at end of file
+from src.graph import get_data_stamp, get_data_version, get_movie_tables, load_details
+from src.storage import load_edges, load_movies, store_exists
+
+JUMPSCARES_PATH = 'data/jumpscares.csv'
+ANALYTICS_DIR = 'data/analytics'
+MEASURES = ['Imdb', 'tomato', 'Jump Count', 'Jump Scare Rating', 'Runtime']
+DETAIL_COLUMNS = ['link', 'movie', 'tomato', 'Runtime', 'Major Jump Scares', 'Minor Jump Scares']
+CUBE_DIMENSIONS = {
+    'year': ['Year'],
+    'decade': ['Decade'],
+    'tag': ['Tag'],
+    'director': ['Director'],
+    'netflix': ['Netflix'],
+    'decade_netflix': ['Decade', 'Netflix'],
+    'tag_netflix': ['Tag', 'Netflix']
+}
+ANALYTICS_TABLES = list(CUBE_DIMENSIONS) + ['movies', 'trends', 'netflix_effect', 'pearson', 'spearman', 'outliers']
+OUTLIER_THRESHOLD = 3.5
+
+# computed once per data version and kept in data/analytics/<version> as Parquet, so every
+# question afterwards is a lookup of one of these tables. The data files are only hashed again
+# when their modification times change.
+analytics_cache = {}
+
+
+def get_analytics():
+    stamp = get_analytics_stamp()
+    if stamp not in analytics_cache:
+        path = os.path.join(ANALYTICS_DIR, get_analytics_version())
+        if not os.path.exists(path):
+            save_analytics(build_analytics(), path)
+        analytics_cache.clear()
+        analytics_cache[stamp] = load_analytics(path)
+    return analytics_cache[stamp]
+
+
+def get_analytics_stamp():
+    stat = os.stat(JUMPSCARES_PATH)
+    analytics_stamp = ((JUMPSCARES_PATH, stat.st_mtime_ns, stat.st_size),) + get_data_stamp()
+    return analytics_stamp
+
+
+def get_analytics_version():
+    digest = hashlib.sha1(open(JUMPSCARES_PATH, 'rb').read())
+    digest.update(get_data_version().encode())
+    version = digest.hexdigest()
+    return version
+
+
+def build_analytics():
+    movies, tags = get_movie_frame()
+    tagged = movies.merge(tags, on='movie')
+    analytics = {name: get_group_stats(tagged if 'Tag' in keys else movies, keys) for name, keys in CUBE_DIMENSIONS.items()}
+    analytics.update({
+        'movies': movies,
+        'trends': get_trends(movies),
+        'netflix_effect': get_netflix_effect(movies),
+        'pearson': get_correlations(movies, 'pearson'),
+        'spearman': get_correlations(movies, 'spearman'),
+        'outliers': get_outliers(movies)
+    })
+    return analytics
+
+
+def get_movie_frame():
+    # the main table joined with the parsed detail pages on the link, plus the movie/tag pairs
+    jumpscares = pd.read_csv(JUMPSCARES_PATH, index_col=0)
+    if store_exists():
+        details, edges = load_movies(DETAIL_COLUMNS), load_edges()
+    else:
+        tables = get_movie_tables(load_details())
+        details, edges = tables['movies'][DETAIL_COLUMNS], tables['edges']
+    movies = jumpscares.merge(details, on='link', how='left')
+    movies['movie'] = movies['movie'].fillna(movies['Movie Name'])
+    movies['Netflix'] = movies['Netflix (US)'] == 'Yes'
+    movies['Decade'] = movies['Year'] // 10 * 10
+    tags = edges.loc[edges['connection'] == 'tag', ['movie', 'object']].rename(columns={'object': 'Tag'})
+    return movies, tags
+
+
+def get_group_stats(frame, keys):
+    grouped = frame.groupby(keys)
+    stats = grouped[MEASURES].agg(['mean', 'median', 'std', 'min', 'max'])
+    stats.columns = [f'{measure} {stat}' for measure, stat in stats.columns]
+    stats.insert(0, 'movies', grouped.size())
+    return stats.reset_index()
+
+
+def get_trends(movies):
+    # least-squares slope of every measure against the release year, per decade
+    years = movies['Year'].values.astype(np.float64)[:, None]
+    values = movies[MEASURES].values.astype(np.float64)
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    mean_years = np.where(present, years, 0).sum(axis=0) / counts
+    mean_values = np.where(present, values, 0).sum(axis=0) / counts
+    covariance = np.where(present, (years - mean_years) * (values - mean_values), 0).sum(axis=0)
+    variance = np.where(present, (years - mean_years) ** 2, 0).sum(axis=0)
+    trends = pd.DataFrame({
+        'measure': MEASURES,
+        'movies': counts,
+        'slope per decade': covariance / variance * 10,
+        'spearman with year': movies[['Year'] + MEASURES].astype(np.float64).corr(method='spearman')['Year'][MEASURES].values
+    })
+    return trends
+
+
+def get_netflix_effect(movies):
+    # difference of the means with Welch's t statistic
+    stats = movies.groupby('Netflix')[MEASURES].agg(['mean', 'var', 'count']).reindex([True, False])
+    on, off = stats.loc[True].unstack(), stats.loc[False].unstack()
+    netflix_effect = pd.DataFrame({
+        'netflix mean': on['mean'],
+        'other mean': off['mean'],
+        'difference': on['mean'] - off['mean'],
+        'welch t': (on['mean'] - off['mean']) / np.sqrt(on['var'] / on['count'] + off['var'] / off['count'])
+    }).reindex(MEASURES).rename_axis('measure').reset_index()
+    return netflix_effect
+
+
+def get_correlations(movies, method):
+    correlations = movies[MEASURES].astype(np.float64).corr(method=method).rename_axis('measure').reset_index()
+    return correlations
+
+
+def get_outliers(movies, threshold=OUTLIER_THRESHOLD):
+    # robust z-scores from the median and the median absolute deviation of each measure
+    values = movies.set_index('movie')[MEASURES].astype(np.float64)
+    deviations = values - values.median()
+    scores = 0.6745 * deviations / deviations.abs().median().replace(0, np.nan)
+    outliers = pd.DataFrame({'value': values.stack(), 'score': scores.stack()}).dropna()
+    outliers = outliers[outliers['score'].abs() > threshold]
+    outliers = outliers.iloc[np.argsort(-outliers['score'].abs().values, kind='stable')].rename_axis(['movie', 'measure']).reset_index()
+    return outliers
+
+
+def save_analytics(analytics, path):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, table in analytics.items():
+        table.to_parquet(os.path.join(tmp_path, name + '.parquet'), index=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_analytics(path):
+    analytics = {name: pd.read_parquet(os.path.join(path, name + '.parquet')) for name in ANALYTICS_TABLES}
+    return analytics
@@ -0,0 +1,398 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+from plotly.utils import PlotlyJSONEncoder
+from src.graph import build_graph, create_graph, get_movie_tables, index_graph, mark_nodes, mark_all_average_scores, SCORE_FIELDS
+from src.graph_metrics import mark_graph_metrics
+from src.graph_store import load_graph_artifact, save_graph_artifact
+from src.layout import LAYOUTS, compute_layout
+from src.page_store import load_page
+from src.figure_cache import get_selection_info
+from src.payload import decode_array, encode_payload
+from src.scrape import parse_stored_pages
+from src.similarity import index_similar_movies
+from src.synthetic import get_synthetic_details
+from src.timeline import get_timeline, get_timeline_stats
+from src.visualize_graph import get_edge_coordinates, get_edge_trace, get_figure, get_figure_base, get_geometry, get_marker, get_node_trace, get_positions, use_lod
+
+# seconds allowed for a cold `import <module>`: main.py has to stay fast for every subcommand, and
+# the scraper, the graph and the dashboard are what the subcommands import
+IMPORT_BUDGETS = {
+    'main': 0.3,
+    'src.scrape': 1.0,
+    'src.graph': 1.5,
+    'app': 3.0
+}
+# packages those imports must not load at all, which catches a stray top-level import even where
+# it stays inside the time budget on a fast machine
+IMPORT_EXCLUDES = {
+    'main': ['numpy', 'pandas', 'networkx', 'pyarrow', 'flask', 'plotly'],
+    'src.scrape': ['networkx', 'flask', 'plotly', 'dash'],
+    'src.graph': ['flask', 'plotly', 'dash'],
+    'app': []
+}
+PIPELINE_STAGES = ['synthetic', 'tables', 'create_graph', 'mark_nodes', 'index_graph', 'graph_metrics', 'similar_movies',
+                   'save_graph', 'get_graph', 'layout', 'node_trace', 'edge_trace', 'update_geometry', 'update_marker',
+                   'update_selection']
+# stages that add to the graph they are given, so they can only be timed once per graph
+GRAPH_BUILD_STAGES = ['mark_nodes', 'index_graph', 'graph_metrics', 'similar_movies']
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_cached_links():
+    jumpscares = pd.read_csv('data/jumpscares.csv')
+    links = jumpscares['link'].to_list()
+    return links
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    duration = time.perf_counter() - start
+    return result, duration
+
+
+def reference_parse_pages(links):
+    # the parsing loop of get_detailed_data before the page store, reading the stored pages
+    # instead of requesting them
+    data_details = dict()
+    for link in links:
+        soup = BeautifulSoup(load_page(link), 'lxml')
+        movie = soup.find('h1').getText().replace('Jump Scares In', '')
+        content_part = soup.find('div', class_='entry-content')
+        all_info = content_part.find_all('p')[:-3]
+        data_details[movie] = dict()
+        data_details[movie]['link'] = link
+        data_details[movie]['scare'] = {}
+        for info in all_info:
+            contents = info.contents
+            num_of_contents = len(info.contents)
+            if 'Tags:' in str(info):
+                field = 'Tags'
+                value = [content.getText().strip() for content in contents if 'a href' in str(content)]
+                data_details[movie][field] = value
+            elif 'peekaboo_content' in str(info):
+                scare_contents = info.getText().replace('-', '–').split('–')
+                timestamp = scare_contents[0].strip()
+                description = scare_contents[1].strip()
+                major = '<strong>' in str(contents[0])
+                data_details[movie]['scare'][timestamp] = {}
+                data_details[movie]['scare'][timestamp]['desc'] = description
+                data_details[movie]['scare'][timestamp]['major'] = major
+            elif ('imdb.com' in str(info)) |('Rotten Tomatoes:' in str(info)):
+                imdb = info.contents[1].strip()
+                tomato = info.contents[3].strip()
+                data_details[movie]['imdb'] = imdb
+                data_details[movie]['tomato'] = tomato
+            elif num_of_contents > 1:
+                try:
+                    field = contents[0].getText().replace(':', '').strip()
+                    value = contents[1].strip()
+                except:
+                    if ':' in info.getText()[1:3]:
+                        scare_contents = info.getText().replace('-', '–').split('–')
+                        timestamp = scare_contents[0].strip()
+                        description = scare_contents[1].strip()
+                        major = '<strong>' in str(contents[0])
+                        data_details[movie]['scare'][timestamp] = {}
+                        data_details[movie]['scare'][timestamp]['desc'] = description
+                        data_details[movie]['scare'][timestamp]['major'] = major
+                    elif ':' in str(info):
+                        field, value = info.getText().split(':')
+                    else:
+                        print(f'{movie} - nothing found in {str(info)}')
+                data_details[movie][field] = value
+            elif ':' in info.getText()[1:3]:
+                scare_contents = info.getText().replace('-', '–').split('–')
+                timestamp = scare_contents[0].strip()
+                description = scare_contents[1].strip()
+                major = '<strong>' in str(contents[0])
+                data_details[movie]['scare'][timestamp] = {}
+                data_details[movie]['scare'][timestamp]['desc'] = description
+                data_details[movie]['scare'][timestamp]['major'] = major
+            else:
+                print(f'{movie} - nothing found in {str(info)}')
+    return data_details
+
+
+def bench_parse(workers=4):
+    links = get_cached_links()
+    _, reference_duration = timeit(reference_parse_pages, links)
+    _, serial_duration = timeit(parse_stored_pages, links, 1)
+    _, parallel_duration = timeit(parse_stored_pages, links, workers)
+    print(f'before (inline loop): {len(links) / reference_duration:.1f} pages/sec')
+    print(f'serial: {len(links) / serial_duration:.1f} pages/sec')
+    print(f'{workers} processes: {len(links) / parallel_duration:.1f} pages/sec')
+
+
+def reference_average_scores(G, fields):
+    groups = [node for node, data in G.nodes(data=True) if data['is_instance'] in ['person', 'tag']]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        average_scores = {group: [np.round(np.nanmean([G.node[movie][field] for _, movie in G.edges(group) if field in G.node[movie]]), 2) for field in fields] for group in groups}
+    return average_scores
+
+
+def check_average_scores(G, fields=SCORE_FIELDS):
+    expected = reference_average_scores(G, fields)
+    for group, scores in expected.items():
+        actual = [G.node[group][field] for field in fields]
+        assert np.allclose(actual, scores, equal_nan=True), f'{group}: {actual} != {scores}'
+    print(f'average scores match the reference for {len(expected)} directors and tags')
+
+
+def bench_average_scores(n_movies=100000):
+    check_average_scores(build_graph())
+    G = build_graph(get_synthetic_details(n_movies), 'synthetic')
+    check_average_scores(G)
+    _, reference_duration = timeit(reference_average_scores, G, SCORE_FIELDS)
+    _, vectorized_duration = timeit(mark_all_average_scores, G, SCORE_FIELDS)
+    print(f'{n_movies} movies, reference: {reference_duration:.2f}s, vectorized: {vectorized_duration:.2f}s')
+
+
+def reference_edge_coordinates(df_edges, df_pos):
+    df_edges = df_edges.merge(df_pos, left_on='a', right_on='index', suffixes=('o', 'a')).merge(df_pos, left_on='b', right_on='index', suffixes=('a', 'b'))
+    x = df_edges.apply(lambda o: tuple([o.xa, o.xb, None]), axis=1)
+    x = [single_x for tuple_x in x for single_x in tuple_x]
+    y = df_edges.apply(lambda o: tuple([o.ya, o.yb, None]), axis=1)
+    y = [single_y for tuple_y in y for single_y in tuple_y]
+    return x, y
+
+
+def bench_edge_trace(n_edges=100000, n_nodes=None, seed=0):
+    n_nodes = n_nodes or n_edges // 5
+    rng = np.random.RandomState(seed)
+    positions = rng.rand(n_nodes, 2)
+    edges = rng.randint(0, n_nodes, (n_edges, 2))
+    df_pos = pd.DataFrame({'index': np.arange(n_nodes), 'x': positions[:, 0], 'y': positions[:, 1]})
+    df_edges = pd.DataFrame(edges, columns=['a', 'b'])
+    _, reference_duration = timeit(reference_edge_coordinates, df_edges, df_pos)
+    _, vectorized_duration = timeit(get_edge_coordinates, positions, edges)
+    print(f'{n_edges} edges, DataFrame.apply: {reference_duration:.2f}s, numpy: {vectorized_duration:.4f}s')
+
+
+def bench_timeline(n_movies=100000):
+    tables = get_movie_tables(get_synthetic_details(n_movies))
+    timeline, timeline_duration = timeit(get_timeline, tables['scares'], tables['movies']['movie'])
+    _, stats_duration = timeit(get_timeline_stats, timeline)
+    print(f"{n_movies} movies, {len(timeline['seconds'])} scares, timeline: {timeline_duration * 1000:.1f}ms, stats: {stats_duration * 1000:.1f}ms")
+
+
+LOAD_SCRIPT = """
+import json, sys, time
+from src.benchmark import get_memory
+from src.graph_store import load_graph_artifact
+before = get_memory()
+start = time.perf_counter()
+G = load_graph_artifact(sys.argv[1])
+loaded = get_memory()
+load_seconds = time.perf_counter() - start
+start = time.perf_counter()
+for _ in G.nodes(data=True):
+    pass
+assembled = get_memory()
+assemble_seconds = time.perf_counter() - start
+print(json.dumps({
+    'load': {'seconds': load_seconds, **{key: loaded[key] - before[key] for key in before}},
+    'all nodes assembled': {'seconds': load_seconds + assemble_seconds, **{key: assembled[key] - before[key] for key in before}}
+}))
+"""
+
+
+def get_memory():
+    # resident and private (not shared with other processes) memory in MB, from /proc on Linux
+    memory = {}
+    for line in open('/proc/self/smaps_rollup'):
+        key, value = line.split(':')[0], line.split()[1:2]
+        if key == 'Rss':
+            memory['rss_mb'] = int(value[0]) / 1024
+        elif key in ['Private_Clean', 'Private_Dirty']:
+            memory['private_mb'] = memory.get('private_mb', 0) + int(value[0]) / 1024
+    return memory
+
+
+def bench_load(n_movies=100000):
+    # a worker's cold start from the graph artifact in a fresh process: loading it, and loading it
+    # with every node's attribute dict assembled, which is what the loader did before they were
+    # assembled on first use
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        save_graph_artifact(build_graph(get_synthetic_details(n_movies), f'synthetic-{n_movies}'), artifact_dir)
+        result = subprocess.run([sys.executable, '-c', LOAD_SCRIPT, artifact_dir], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    for stage, stats in json.loads(result.stdout).items():
+        print(f"{n_movies} movies, {stage:<20}{stats['seconds'] * 1000:10.1f}ms{stats['rss_mb']:10.1f}MB rss{stats['private_mb']:10.1f}MB private")
+
+
+def get_import_times(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    import_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        import_times.append((name.strip(), depth, int(cumulative) / 1e6))
+    return import_times
+
+
+def check_import(module, budget=None):
+    # a cold import of module, with what is wrong with it: over its budget or loading an excluded package
+    budget = IMPORT_BUDGETS[module] if budget is None else budget
+    import_times = get_import_times(module)
+    total = next(seconds for name, depth, seconds in import_times if name == module and depth == 0)
+    loaded = {name.split('.')[0] for name, _, _ in import_times}
+    problems = [f'import {module} loads {package}' for package in IMPORT_EXCLUDES.get(module, []) if package in loaded]
+    if total > budget:
+        problems.append(f'import {module} takes {total * 1000:.0f}ms, over its {budget * 1000:.0f}ms budget')
+    return import_times, total, problems
+
+
+def bench_import(module='main', budget=None, top=10):
+    budget = IMPORT_BUDGETS[module] if budget is None else budget
+    import_times, total, problems = check_import(module, budget)
+    index = next(i for i, (name, depth, _) in enumerate(import_times) if name == module and depth == 0)
+    # -X importtime lists children before their parent, walk back to collect the direct imports
+    direct = []
+    for name, depth, seconds in reversed(import_times[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((name, depth, seconds))
+    direct = sorted(direct, key=lambda item: -item[2])
+    for name, _, seconds in direct[:top]:
+        print(f'{seconds * 1000:8.1f}ms  {name}')
+    print(f'import {module}: {total * 1000:.1f}ms, budget: {budget * 1000:.0f}ms')
+    if problems:
+        raise SystemExit('\n'.join(problems))
+
+
+def measure(func, *args, memory=True):
+    # peak is the most memory allocated at once while the stage ran, tracing slows allocations
+    # down so pass memory=False for clean timings
+    if memory:
+        tracemalloc.start()
+    result, duration = timeit(func, *args)
+    peak = None
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, duration, peak
+
+
+def get_payload(func, *args):
+    # callbacks are timed the way Dash answers them: computed, then serialised to JSON
+    payload = json.dumps(func(*args), cls=PlotlyJSONEncoder)
+    return payload
+
+
+def get_busiest_node(G):
+    busiest_node = G.graph['nodes'][np.argmax(np.diff(G.graph['indptr']))]
+    return busiest_node
+
+
+def bench_pipeline(sizes=(1000, 10000, 100000), method='fast', memory=True, output=None, baseline=None):
+    # times every stage from synthetic records to callback payloads, the spring layout is dense
+    # without scipy so the default is the grid-approximated one
+    baseline = {(row['movies'], row['stage']): row for row in json.load(open(baseline))} if baseline else {}
+    results = []
+    for n_movies in sizes:
+        with tempfile.TemporaryDirectory() as artifact_dir:
+            for row in bench_pipeline_size(n_movies, method, memory, artifact_dir):
+                print_pipeline_row(row, baseline.get((n_movies, row['stage'])))
+                results.append(row)
+    if output:
+        json.dump(results, open(output, 'w'), indent=1)
+    return results
+
+
+def bench_pipeline_size(n_movies, method, memory, artifact_dir):
+    def run(stage, func, *args):
+        result, duration, peak = measure(func, *args, memory=memory)
+        rows.append({'movies': n_movies, 'stage': stage, 'seconds': duration, 'peak_mb': peak / 2 ** 20 if memory else None})
+        return result
+
+    rows = []
+    run_pipeline(n_movies, method, artifact_dir, run)
+    return rows
+
+
+def run_pipeline(n_movies, method, artifact_dir, run):
+    # every stage goes through run(stage, func, *args), which returns what func returns; the
+    # pytest benchmarks in tests/test_pipeline_benchmark.py time the same stages
+    data_details = run('synthetic', get_synthetic_details, n_movies)
+    tables = run('tables', get_movie_tables, data_details)
+    graph_df = tables['edges'].rename(columns={'movie': 'subject'})
+    G = run('create_graph', create_graph, graph_df)
+    G.graph['version'] = f'synthetic-{n_movies}'
+    G = run('mark_nodes', mark_nodes, G, tables['movies'], graph_df, tables['scares'])
+    run('index_graph', index_graph, G)
+    run('graph_metrics', mark_graph_metrics, G)
+    run('similar_movies', index_similar_movies, G)
+    run('save_graph', save_graph_artifact, G, artifact_dir)
+    G = run('get_graph', load_graph_artifact, artifact_dir)
+    # computed here rather than loaded from data/layouts, and used by the stages below
+    G.graph['layout_method'] = method
+    positions = run('layout', compute_layout, G, method, LAYOUTS[method])
+    G.graph['positions'] = {method: positions}
+    run('node_trace', get_node_trace, G, positions, None)
+    run('edge_trace', get_edge_trace, G, positions)
+    run('update_geometry', get_payload, get_geometry, G, None, None, use_lod(G, 'auto'))
+    run('update_marker', get_payload, get_marker, G, ('imdb', 'is_instance'))
+    run('update_selection', get_payload, get_selection_info, G, get_busiest_node(G))
+
+
+def print_pipeline_row(row, reference=None):
+    line = f"{row['movies']:>7} movies  {row['stage']:<17}{row['seconds'] * 1000:10.1f}ms"
+    if row['peak_mb'] is not None:
+        line += f"{row['peak_mb']:10.1f}MB"
+    if reference:
+        line += f"  x{row['seconds'] / max(reference['seconds'], 1e-9):.2f} vs baseline"
+    print(line)
+
+
+def get_payload_sizes(payload):
+    plain = json.dumps(payload, cls=PlotlyJSONEncoder).encode()
+    compact = json.dumps(encode_payload(payload), cls=PlotlyJSONEncoder).encode()
+    sizes = [len(plain), len(compact), len(gzip.compress(plain, 6)), len(gzip.compress(compact, 6))]
+    return sizes
+
+
+def bench_payloads(n_movies=10000, dims=('imdb', 'Runtime')):
+    # bytes each dashboard interaction sends: plain JSON lists as before, the base64 float32
+    # encoding, and both gzipped as Flask-Compress sends them
+    G = build_graph(get_synthetic_details(n_movies), 'synthetic')
+    axes = (None, None) + tuple(dims)
+    positions = get_positions(G, axes)
+    x, y = positions[:, 0], positions[:, 1]
+    viewport = (np.nanmin(x), np.nanmedian(x), np.nanmin(y), np.nanmedian(y))
+    geometry = get_geometry(G, axes)
+    check_payload_roundtrip(geometry)
+    payloads = {
+        'full figure (before stores)': get_figure(get_edge_trace(G, positions), get_node_trace(G, positions, ('imdb', 'is_instance') + tuple(dims))[0]),
+        'page load (figure base)': get_figure_base(G),
+        'axes change': geometry,
+        'zoom (webgl level of detail)': get_geometry(G, axes, viewport, lod=True),
+        'size/colour change': get_marker(G, ('imdb', 'is_instance')),
+        'node click': get_selection_info(G, get_busiest_node(G))
+    }
+    print(f"{'interaction':<30}{'json':>12}{'compact':>12}{'json gzip':>12}{'compact gzip':>14}")
+    for interaction, payload in payloads.items():
+        sizes = get_payload_sizes(payload)
+        print(f'{interaction:<30}' + ''.join(f'{size / 1024:>11.1f}K' for size in sizes[:3]) + f'{sizes[3] / 1024:>13.1f}K')
+
+
+def check_payload_roundtrip(payload):
+    compact = encode_payload(payload)
+    for key in ['x', 'y', 'edge_x', 'edge_y']:
+        values = payload[key]
+        tolerance = (np.nanmax(values) - np.nanmin(values)) * 1e-3 if np.isfinite(values).any() else 0
+        assert np.allclose(decode_array(compact[key]), values, atol=tolerance, equal_nan=True), f'{key} does not survive encoding'
@@ -0,0 +1,82 @@
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+from src.graph import PLOT_FIELDS
+from src.visualize_graph import get_algo_positions, plot_G
+
+EXPORT_DIR = 'data/export'
+DEFAULT_DIMS = ('imdb', 'is_instance')
+
+# set in the parent before the pool forks, so every worker shares the graph and its layout
+# copy-on-write instead of loading or computing them again
+export_graph = None
+
+
+def export_views(G, specs='all', workers=4, formats=('html', 'json'), path=EXPORT_DIR):
+    global export_graph
+    specs = get_export_specs(G) if specs == 'all' else [(tuple(dims) if dims else None, node) for dims, node in specs]
+    os.makedirs(path, exist_ok=True)
+    if 'html' in formats:
+        # one plotly.js bundle next to the pages instead of 3MB inlined into each of them
+        with open(os.path.join(path, 'plotly.min.js'), 'w') as bundle:
+            bundle.write(get_plotlyjs())
+    get_algo_positions(G)
+    export_graph = G
+    jobs = [(i, dims, node, formats, path) for i, (dims, node) in enumerate(specs)]
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            views = list(executor.map(export_view, jobs, chunksize=max(1, len(jobs) // (workers * 8))))
+    else:
+        views = [export_view(job) for job in jobs]
+    manifest = {
+        'version': G.graph['version'],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seconds': time.perf_counter() - start,
+        'views': views
+    }
+    tmp_path = os.path.join(path, 'manifest.json.tmp')
+    json.dump(manifest, open(tmp_path, 'w'), indent=1)
+    os.replace(tmp_path, os.path.join(path, 'manifest.json'))
+    print(f"exported {len(views)} views in {manifest['seconds']:.1f}s to {path}")
+    return manifest
+
+
+def get_export_specs(G, fields=PLOT_FIELDS):
+    # every size/colour pair on the layout, every x/y pair with the default size and colour, and
+    # the neighbourhood of every director and tag
+    specs = [((size, color), None) for size, color in itertools.product(fields, fields)]
+    specs += [(DEFAULT_DIMS + (x, y), None) for x, y in itertools.permutations(fields, 2)]
+    specs += [(DEFAULT_DIMS, node) for node, is_group in zip(G.graph['nodes'], G.graph['table']['is_instance'].isin(['person', 'tag'])) if is_group]
+    return specs
+
+
+def export_view(job):
+    index, dims, node, formats, path = job
+    start = time.perf_counter()
+    name = f'{index:05d}_' + get_slug('_'.join(str(part) for part in (dims or ()) + (node,) if part))
+    view = {'dims': dims, 'node': node, 'files': {}}
+    try:
+        fig = plot_G(export_graph, dims, node, auto_open=False)
+        if 'html' in formats:
+            view['files']['html'] = name + '.html'
+            pio.write_html(fig, os.path.join(path, name + '.html'), include_plotlyjs='directory', auto_open=False)
+        if 'json' in formats:
+            view['files']['json'] = name + '.json'
+            json.dump(fig, open(os.path.join(path, name + '.json'), 'w'), cls=PlotlyJSONEncoder)
+    except (KeyError, ValueError) as error:
+        view['error'] = repr(error)
+    view['seconds'] = time.perf_counter() - start
+    return view
+
+
+def get_slug(text, max_length=80):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-')[:max_length] or 'default'
+    return slug
@@ -0,0 +1,99 @@
+import collections
+import os
+import threading
+from flask_caching import Cache
+from src.markdown_info import get_markdown_info
+from src.payload import encode_payload
+from src.visualize_graph import get_geometry, get_marker, get_selection, use_lod
+
+# warm_cache stores at most WARM_LIMIT entries per graph version. Over its threshold the
+# filesystem cache deletes every third file, so the threshold holds the warmed entries of the live
+# and the previous version plus USER_ENTRIES of what users ask for. Entries are keyed by the graph
+# version and never go stale, so they don't expire either.
+WARM_LIMIT = 600
+USER_ENTRIES = 400
+
+cache = Cache(config={
+    # Note that filesystem cache doesn't work on systems with ephemeral
+    # filesystems like Heroku.
+    'CACHE_TYPE': 'filesystem',
+    'CACHE_DIR': 'cache-directory',
+    'CACHE_THRESHOLD': 2 * WARM_LIMIT + USER_ENTRIES,
+    'CACHE_DEFAULT_TIMEOUT': 0
+})
+
+# the filesystem cache is shared between workers but prunes arbitrary entries once it is full,
+# so each worker also keeps its most recently used results in a small LRU in front of it
+LOCAL_CACHE_SIZE = 64
+local_cache = collections.OrderedDict()
+local_lock = threading.Lock()
+stats = collections.Counter()
+
+
+def cached(name, func, G, *args):
+    key = f"{name}:{G.graph['version']}:{args!r}"
+    with local_lock:
+        if key in local_cache:
+            local_cache.move_to_end(key)
+            stats['local_hits'] += 1
+            return local_cache[key]
+    value = cache.get(key)
+    if value is None:
+        stats['misses'] += 1
+        value = encode_payload(func(G, *args))
+        cache.set(key, value)
+    else:
+        stats['shared_hits'] += 1
+    with local_lock:
+        local_cache[key] = value
+        if len(local_cache) > LOCAL_CACHE_SIZE:
+            local_cache.popitem(last=False)
+    return value
+
+
+def get_cache_stats():
+    cache_stats = dict(stats, pid=os.getpid(), local_size=len(local_cache))
+    return cache_stats
+
+
+def get_cached_geometry(G, dim2, dim3, viewport=None, render='auto', query=None):
+    if dim2 is None or dim3 is None:
+        dims = None
+    else:
+        dims = (None, None, dim2, dim3)
+    lod = use_lod(G, render)
+    if not lod:
+        viewport = None
+    return cached('geometry', get_geometry, G, dims, viewport, lod, query)
+
+
+def get_cached_marker(G, dim0, dim1):
+    return cached('marker', get_marker, G, (dim0, dim1))
+
+
+def get_cached_selection(G, node):
+    return cached('selection', get_selection_info, G, node)
+
+
+def get_selection_info(G, node):
+    selection_info = (get_selection(G, node), get_markdown_info(G, node))
+    return selection_info
+
+
+def get_warm_views(fields, limit=WARM_LIMIT):
+    # the default view, every size/colour pair, whose markers are small, then as many x/y pairs as
+    # fit in the limit
+    views = [('geometry', None, None), ('marker', 'imdb', 'is_instance')]
+    views += [('marker', dim0, dim1) for dim0 in fields for dim1 in fields if (dim0, dim1) != ('imdb', 'is_instance')]
+    views += [('geometry', dim2, dim3) for dim2 in fields for dim3 in fields if dim2 != dim3]
+    return views[:limit]
+
+
+def warm_cache(G, fields, limit=WARM_LIMIT):
+    views = get_warm_views(fields, limit)
+    for kind, dim_a, dim_b in views:
+        if kind == 'geometry':
+            get_cached_geometry(G, dim_a, dim_b)
+        else:
+            get_cached_marker(G, dim_a, dim_b)
+    print(f"warmed {len(views)} views of version {G.graph['version']}")
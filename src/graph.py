@@ -1,24 +1,178 @@
 import networkx as nx
 import numpy as np
 import pandas as pd
+import hashlib
 import json
+import os
 import re
+from src.graph_metrics import GRAPH_METRIC_FIELDS, mark_graph_metrics
+from src.graph_store import ARTIFACT_DIR, read_artifact_version, load_graph_artifact, get_upper_edges, get_attribute_table, gather_rows
+from src.metrics import timed
+from src.storage import DETAILS_PATH, MOVIE_COLUMNS, get_store_paths, load_edges, load_movies, load_scares, store_exists
+from src.similarity import index_similar_movies
+from src.timeline import TIMELINE_FIELDS, get_timeline, get_timeline_stats
 
+SCORE_FIELDS = ['imdb', 'tomato', 'Jump Scares', 'Major Jump Scares', 'Minor Jump Scares', 'Runtime', 'Scare Rating']
+PLOT_FIELDS = SCORE_FIELDS + TIMELINE_FIELDS + GRAPH_METRIC_FIELDS + ['is_instance']
+COUNT_FIELDS = ['Jump Scares', 'Major Jump Scares', 'Minor Jump Scares']
 
+
+@timed('get_graph')
 def get_graph():
-    data_details = load_details()
-    directors_connections_all = get_directors(data_details)
-    tags_connections_raw = get_tags(data_details)
-    tags_connections = fix_tags(tags_connections_raw)
-    concatenated_connections = concatenate_connections(directors_connections_all, tags_connections)
-    graph_df = get_graph_df(concatenated_connections)
+    version = get_data_version()
+    if read_artifact_version() == version:
+        G = load_graph_artifact()
+    else:
+        G = build_graph()
+    return G
+
+
+def get_data_version():
+    digest = hashlib.sha1()
+    for source_path in get_source_paths():
+        digest.update(open(source_path, 'rb').read())
+    version = digest.hexdigest()
+    return version
+
+
+def get_source_paths():
+    if store_exists():
+        source_paths = get_store_paths()
+    else:
+        source_paths = [DETAILS_PATH]
+    return source_paths
+
+
+def get_data_stamp():
+    # a cheap stand-in for get_data_version: sizes and modification times of the data files and
+    # of the published artifact pointer, which change whenever the data or the artifact does
+    paths = get_source_paths() + [os.path.join(ARTIFACT_DIR, 'CURRENT')]
+    data_stamp = tuple((path, os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else (path, None, None) for path in paths)
+    return data_stamp
+
+
+@timed('build_graph')
+def build_graph(data_details=None, version=None):
+    if data_details is None:
+        version = get_data_version()
+        if store_exists():
+            movies, edges, scares = load_movies(), load_edges(), load_scares(columns=['movie', 'seconds'])
+        else:
+            tables = get_movie_tables(load_details())
+            movies, edges, scares = tables['movies'], tables['edges'], tables['scares']
+    else:
+        tables = get_movie_tables(data_details)
+        movies, edges, scares = tables['movies'], tables['edges'], tables['scares']
+    graph_df = edges.rename(columns={'movie': 'subject'})
     G = create_graph(graph_df)
-    G = mark_nodes(G, data_details, graph_df)
+    G = mark_nodes(G, movies, graph_df, scares)
+    G.graph['version'] = version
+    index_graph(G)
+    mark_graph_metrics(G)
+    index_similar_movies(G)
     return G
 
 
+@timed('index_graph')
+def index_graph(G):
+    nodes = list(G)
+    node_ids = {node: i for i, node in enumerate(nodes)}
+    degrees = [len(G.adj[node]) for node in nodes]
+    indptr = np.concatenate([[0], np.cumsum(degrees)]).astype(np.int64)
+    indices = np.array([node_ids[neighbor] for node in nodes for neighbor in G.adj[node]], dtype=np.int32)
+    connections = np.array([G.adj[node][neighbor]['connection'] for node in nodes for neighbor in G.adj[node]])
+    edges, upper = get_upper_edges(indptr, indices)
+    table = get_attribute_table(G, nodes, ('is_instance', 'Netflix (US)'))
+    node_types = table['is_instance'].cat.codes.values
+    hood_indptr, hood_indices = get_neighborhoods(indptr, indices, node_types)
+    G.graph.update({
+        'nodes': nodes,
+        'node_ids': node_ids,
+        'table': table,
+        'indptr': indptr,
+        'indices': indices,
+        'edges': edges,
+        'edge_connections': connections[upper],
+        'node_types': node_types,
+        'hood_indptr': hood_indptr,
+        'hood_indices': hood_indices
+    })
+
+
+def get_neighborhoods(indptr, indices, node_types):
+    # a node's neighborhood is itself, its neighbors and the neighbors' neighbors of another type
+    hoods = []
+    for node_id in range(len(indptr) - 1):
+        neighbors = indices[indptr[node_id]:indptr[node_id + 1]]
+        extra = gather_rows(indptr, indices, neighbors)
+        extra = extra[node_types[extra] != node_types[node_id]]
+        hoods.append(np.unique(np.concatenate([neighbors, extra, [node_id]])))
+    hood_indptr = np.concatenate([[0], np.cumsum([len(hood) for hood in hoods])]).astype(np.int64)
+    hood_indices = np.concatenate(hoods).astype(np.int32)
+    return hood_indptr, hood_indices
+
+
+def get_neighborhood(G, node):
+    node_id = G.graph['node_ids'][node]
+    hood = np.array(G.graph['hood_indices'][G.graph['hood_indptr'][node_id]:G.graph['hood_indptr'][node_id + 1]], dtype=np.int64)
+    return hood
+
+
+def get_induced_edges(G, node_ids):
+    indptr, indices = G.graph['indptr'], G.graph['indices']
+    mask = np.zeros(len(indptr) - 1, dtype=bool)
+    mask[node_ids] = True
+    rows = np.repeat(node_ids, indptr[node_ids + 1] - indptr[node_ids])
+    cols = gather_rows(indptr, indices, node_ids)
+    induced = mask[cols] & (rows < cols)
+    edges = np.stack([rows[induced], cols[induced]], axis=1)
+    return edges
+
+
+def get_movie_tables(data_details):
+    movies = pd.DataFrame([get_movie_row(movie, infos) for movie, infos in data_details.items()], columns=MOVIE_COLUMNS)
+    directors_connections_all = get_directors(data_details)
+    tags_connections = fix_tags(get_tags(data_details))
+    edges = get_graph_df(concatenate_connections(directors_connections_all, tags_connections))
+    edges = edges.rename(columns={'subject': 'movie'})
+    scares = [[movie, timestamp, scare['desc'], scare['major']] for movie, infos in data_details.items() for timestamp, scare in infos.get('scare', {}).items()]
+    scares = pd.DataFrame(scares, columns=['movie', 'timestamp', 'desc', 'major'])
+    scares['seconds'] = parse_timestamps(scares['timestamp'])
+    tables = {'movies': movies, 'edges': edges, 'scares': scares}
+    return tables
+
+
+def get_movie_row(movie, infos):
+    row = {'movie': movie, 'Director': infos.get('Director', infos.get('Directors'))}
+    extra = {}
+    for info_name, info_value in infos.items():
+        if info_name in ['scare', 'Tags', 'Director', 'Directors']:
+            continue
+        info_name, info_value = fix_info(info_name, info_value)
+        if info_name == 'Jump Scares':
+            row.update(parse_jump_scares(info_value))
+        elif info_name in MOVIE_COLUMNS:
+            row[info_name] = info_value
+        else:
+            extra[info_name] = info_value
+    row['extra'] = json.dumps(extra) if extra else None
+    return row
+
+
+def get_store_batches(data_details, batch_size=100):
+    movies = list(data_details)
+    for start in range(0, len(movies), batch_size):
+        yield get_movie_tables({movie: data_details[movie] for movie in movies[start:start + batch_size]})
+
+
+def parse_timestamps(timestamps):
+    parts = timestamps.str.extract(r'(\d+)[:.](\d{2})(?:[:.](\d{2}))?').astype(float)
+    seconds = np.where(parts[2].isna(), parts[0] * 60 + parts[1], parts[0] * 3600 + parts[1] * 60 + parts[2])
+    return seconds
+
+
 def load_details():
-    data_details = json.load(open('data/data_details.json', 'r'))
+    data_details = json.load(open(DETAILS_PATH, 'r'))
     data_details = {k.replace('Jump Scares In ', ''):v for k,v in data_details.items()}
     return data_details
 
@@ -62,29 +216,49 @@ def get_graph_df(concatenated_connections):
     return graph_df
 
 
+@timed('create_graph')
 def create_graph(graph_df):
     G = nx.from_pandas_edgelist(graph_df, 'subject','object','connection')
     return G
 
 
-def mark_nodes(G, data_details, graph_df):
-    mark_movies(G, data_details)
+@timed('mark_nodes')
+def mark_nodes(G, movies, graph_df, scares):
+    mark_movies(G, movies, graph_df)
+    mark_timeline(G, movies, scares)
     mark_directors(G, graph_df)
     mark_tags(G, graph_df)
-    fields = ['imdb', 'tomato', 'Jump Scares', 'Major Jump Scares', 'Minor Jump Scares', 'Runtime', 'Scare Rating']
-    mark_all_average_scores(G, fields)
+    mark_all_average_scores(G, SCORE_FIELDS + TIMELINE_FIELDS)
     return G
 
 
-def mark_movies(G, data_details):
-    for movie, infos in data_details.items():
-        G.node[movie]['is_instance'] = 'movie'
+def mark_movies(G, movies, graph_df):
+    tags = graph_df[graph_df.connection == 'tag'].groupby('subject')['object'].apply(list)
+    for infos in movies.to_dict('records'):
+        movie = infos.pop('movie')
+        extra = infos.pop('extra')
+        G.add_node(movie, is_instance='movie')
+        year = re.search(r'\((\d{4})\)$', movie.strip())
+        if year:
+            G.node[movie]['Year'] = int(year.group(1))
         for info_name, info_value in infos.items():
-            info_name, info_value = fix_info(info_name, info_value)
-            if info_name == 'Jump Scares':
-                fix_jump_scares(G, movie, info_value)
-            else:
-                G.node[movie][info_name] = info_value
+            if pd.isnull(info_value):
+                continue
+            if info_name in COUNT_FIELDS and not np.isnan(info_value):
+                info_value = int(info_value)
+            G.node[movie][info_name] = info_value
+        if movie in tags.index:
+            G.node[movie]['Tags'] = tags[movie]
+        if extra:
+            G.node[movie].update(json.loads(extra))
+
+
+def mark_timeline(G, movies, scares):
+    timeline = get_timeline(scares, movies['movie'])
+    timeline_stats = get_timeline_stats(timeline)
+    for movie, stats in timeline_stats.to_dict('index').items():
+        G.node[movie].update({field: value for field, value in stats.items() if not np.isnan(value)})
+    G.graph['timeline'] = timeline
 
 
 def fix_info(info_name, info_value):
@@ -109,12 +283,15 @@ def imdb_score_to_float(imdb_score):
     return size
 
 
-def fix_jump_scares(G, movie, info_value):
+def parse_jump_scares(info_value):
     both, major, _, minor, _ = info_value.split()
     major = major.replace('(', '')
-    G.node[movie]['Jump Scares'] = int(both)
-    G.node[movie]['Major Jump Scares'] = int(major)
-    G.node[movie]['Minor Jump Scares'] = int(minor)
+    jump_scares = {
+        'Jump Scares': int(both),
+        'Major Jump Scares': int(major),
+        'Minor Jump Scares': int(minor)
+    }
+    return jump_scares
 
 
 def mark_directors(G, graph_df):
@@ -130,21 +307,36 @@ def mark_tags(G, graph_df):
 
 
 def mark_all_average_scores(G, fields):
-    for field in fields:
-        mark_average_scores(G, field)
-
-
-def mark_average_scores(G, field):
-    nodes = [node for node, data in G.nodes(data=True) if data['is_instance'] in ['person', 'tag']]
-    average_scores = {node: get_average_score([movie for node, movie in G.edges(node)], G, field) for node in nodes}
-    for node, score in average_scores.items():
-        G.node[node][field] = score
-
-
-def get_average_score(movies, G, field):
-    imdb_score = np.nanmean([G.nodes[node][field] for node in movies if field in G.nodes[node].keys()])
-    imdb_score = np.round(imdb_score, 2)
-    return imdb_score
+    groups = [node for node, data in G.nodes(data=True) if data['is_instance'] in ['person', 'tag']]
+    movies = [node for node, data in G.nodes(data=True) if data['is_instance'] == 'movie']
+    values = get_field_matrix(G, movies, fields)
+    group_index, movie_index = get_incidence(G, groups, movies)
+    average_scores = get_average_scores(values, group_index, movie_index, len(groups))
+    for group, scores in zip(groups, average_scores):
+        G.node[group].update(zip(fields, scores))
+
+
+def get_field_matrix(G, movies, fields):
+    values = np.array([[G.node[movie].get(field, np.nan) for field in fields] for movie in movies], dtype=np.float64)
+    return values.reshape(len(movies), len(fields))
+
+
+def get_incidence(G, groups, movies):
+    movie_ids = {movie: i for i, movie in enumerate(movies)}
+    incidence = [[group_id, movie_ids[movie]] for group_id, group in enumerate(groups) for movie in G.adj[group] if movie in movie_ids]
+    incidence = np.array(incidence, dtype=np.int64).reshape(-1, 2)
+    return incidence[:, 0], incidence[:, 1]
+
+
+def get_average_scores(values, group_index, movie_index, n_groups):
+    edge_values = values[movie_index]
+    present = ~np.isnan(edge_values)
+    edge_values = np.where(present, edge_values, 0)
+    sums = np.stack([np.bincount(group_index, weights=edge_values[:, i], minlength=n_groups) for i in range(values.shape[1])], axis=1)
+    counts = np.stack([np.bincount(group_index, weights=present[:, i], minlength=n_groups) for i in range(values.shape[1])], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average_scores = np.round(sums / counts, 2)
+    return average_scores.reshape(n_groups, values.shape[1])
 
 
 def _filter_nodes(self, key, value):
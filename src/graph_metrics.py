@@ -0,0 +1,121 @@
+import numpy as np
+from src.graph_store import gather_rows
+from src.metrics import timed
+
+GRAPH_METRIC_FIELDS = ['Degree', 'Betweenness', 'PageRank', 'Community']
+# cost knobs: betweenness runs one breadth-first search per sampled source, so the stage grows
+# linearly with BETWEENNESS_SAMPLES and stays a few seconds at 100k movies with the defaults
+BETWEENNESS_SAMPLES = 64
+PAGERANK_DAMPING = 0.85
+PAGERANK_ITERATIONS = 100
+COMMUNITY_ITERATIONS = 20
+
+
+@timed('mark_graph_metrics')
+def mark_graph_metrics(G, betweenness_samples=BETWEENNESS_SAMPLES, community_iterations=COMMUNITY_ITERATIONS, seed=0):
+    # runs on the adjacency arrays from index_graph and adds the results to the nodes and the
+    # attribute table, so they are stored in the graph artifact with the other columns
+    indptr, indices = G.graph['indptr'], G.graph['indices']
+    table = G.graph['table']
+    metrics = {
+        'Degree': np.diff(indptr),
+        'Betweenness': get_sampled_betweenness(indptr, indices, betweenness_samples, seed),
+        'PageRank': get_pagerank(indptr, indices),
+        'Community': get_label_communities(indptr, indices, (table['is_instance'] == 'movie').values, community_iterations, seed)
+    }
+    for field, values in metrics.items():
+        table[field] = values.astype(np.float64)
+        cast = int if values.dtype.kind == 'i' else float
+        for node, value in zip(G.graph['nodes'], values):
+            G.node[node][field] = cast(value)
+
+
+def get_pagerank(indptr, indices, damping=PAGERANK_DAMPING, iterations=PAGERANK_ITERATIONS, tol=1e-8):
+    n = len(indptr) - 1
+    degrees = np.diff(indptr)
+    dangling = degrees == 0
+    ranks = np.full(n, 1 / n)
+    for _ in range(iterations):
+        shares = np.repeat(ranks / np.maximum(degrees, 1), degrees)
+        new_ranks = damping * (np.bincount(indices, weights=shares, minlength=n) + ranks[dangling].sum() / n) + (1 - damping) / n
+        converged = np.abs(new_ranks - ranks).sum() < n * tol
+        ranks = new_ranks
+        if converged:
+            break
+    return ranks
+
+
+def get_sampled_betweenness(indptr, indices, samples=BETWEENNESS_SAMPLES, seed=0):
+    # Brandes' algorithm from a random sample of sources with level-synchronous searches,
+    # rescaled like networkx.betweenness_centrality(k=samples, normalized=True)
+    n = len(indptr) - 1
+    betweenness = np.zeros(n)
+    if n < 3:
+        return betweenness
+    sources = np.random.RandomState(seed).choice(n, min(samples, n), replace=False)
+    for source in sources:
+        betweenness += get_source_dependencies(indptr, indices, source)
+    betweenness *= n / len(sources) / ((n - 1) * (n - 2))
+    return betweenness
+
+
+def get_source_dependencies(indptr, indices, source):
+    n = len(indptr) - 1
+    degrees = np.diff(indptr)
+    distances = np.full(n, -1, dtype=np.int64)
+    distances[source] = 0
+    paths = np.zeros(n)
+    paths[source] = 1
+    frontier = np.array([source])
+    levels = []
+    while len(frontier):
+        parents = np.repeat(frontier, degrees[frontier])
+        children = gather_rows(indptr, indices, frontier)
+        next_frontier = np.unique(children[distances[children] < 0])
+        distances[next_frontier] = distances[frontier[0]] + 1
+        on_path = distances[children] == distances[frontier[0]] + 1
+        parents, children = parents[on_path], children[on_path]
+        paths += np.bincount(children, weights=paths[parents], minlength=n)
+        levels.append((parents, children))
+        frontier = next_frontier
+    dependencies = np.zeros(n)
+    for parents, children in reversed(levels):
+        dependencies += np.bincount(parents, weights=paths[parents] / paths[children] * (1 + dependencies[children]), minlength=n)
+    dependencies[source] = 0
+    return dependencies
+
+
+def get_label_communities(indptr, indices, is_movie, iterations=COMMUNITY_ITERATIONS, seed=0):
+    # label propagation: every node takes the most common label among its neighbours, keeping
+    # its own on a tie. Updating all nodes at once oscillates on this bipartite graph, so movies
+    # and directors/tags take turns. Communities are numbered from the largest down.
+    n = len(indptr) - 1
+    rng = np.random.RandomState(seed)
+    labels = np.arange(n)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    sides = [np.flatnonzero(is_movie), np.flatnonzero(~is_movie)]
+    noise = rng.rand(n) * 0.25
+    for _ in range(iterations):
+        changed = 0
+        for side in sides:
+            updating = np.zeros(n, dtype=bool)
+            updating[side] = True
+            keep = updating[rows]
+            side_rows, neighbor_labels = rows[keep], labels[indices[keep]]
+            if not len(side_rows):
+                continue
+            pairs, counts = np.unique(side_rows * n + neighbor_labels, return_counts=True)
+            pair_rows, pair_labels = pairs // n, pairs % n
+            scores = counts + 0.5 * (pair_labels == labels[pair_rows]) + noise[pair_labels]
+            order = np.lexsort((-scores, pair_rows))
+            first = np.concatenate([[True], pair_rows[order][1:] != pair_rows[order][:-1]])
+            best_rows, best_labels = pair_rows[order][first], pair_labels[order][first]
+            changed += (labels[best_rows] != best_labels).sum()
+            labels[best_rows] = best_labels
+        if not changed:
+            break
+    _, communities, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+    communities = rank[communities]
+    return communities
@@ -0,0 +1,253 @@
+import collections.abc
+import json
+import os
+import shutil
+import networkx as nx
+import numpy as np
+import pandas as pd
+from src.metrics import timed
+
+ARTIFACT_DIR = 'data/graph'
+ARTIFACT_FORMAT = 9
+# data/graph/<version> holds one artifact each and data/graph/CURRENT names the one to load; the
+# previous versions are kept so running workers can finish with the graph they have mapped
+KEEP_ARTIFACTS = 3
+
+
+def save_graph_artifact(G, path=ARTIFACT_DIR):
+    # each version is written to a temporary directory and renamed into place before CURRENT
+    # points at it, so readers only ever see complete artifacts
+    version_path = os.path.join(path, G.graph['version'])
+    tmp_path = f'{version_path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    nodes = G.graph['nodes']
+    table = G.graph['table']
+    categorical = {field: (table[field].cat.codes.values.astype(np.int8), list(table[field].cat.categories)) for field in table if pd.api.types.is_categorical_dtype(table[field])}
+    columns = {field: table[field].values for field in table if field not in categorical}
+    connections = encode_categorical(get_edge_connections(G))
+    # the remaining attributes as one JSON object per node, concatenated so a node's can be read
+    # on its own; fields held in the columns keep a None placeholder
+    attributes = [json.dumps({field: None if field in columns or field in categorical else value for field, value in G.nodes[node].items()}).encode() for node in nodes]
+    arrays = {
+        'columns': np.stack([values.astype(np.float64) for values in columns.values()]) if columns else np.empty((0, len(nodes))),
+        'attributes': np.frombuffer(b''.join(attributes), dtype=np.uint8),
+        'attribute_offsets': np.concatenate([[0], np.cumsum([len(node_attributes) for node_attributes in attributes])]).astype(np.int64),
+        'indptr': G.graph['indptr'],
+        'indices': G.graph['indices'],
+        'connections': connections[0],
+        'hood_indptr': G.graph['hood_indptr'],
+        'hood_indices': G.graph['hood_indices'],
+        'timeline_seconds': G.graph['timeline']['seconds'],
+        'timeline_offsets': G.graph['timeline']['offsets'],
+        'similar_ids': G.graph['similar_ids'],
+        'similar_scores': G.graph['similar_scores']
+    }
+    arrays.update({f'categorical_{i}': codes for i, (codes, _) in enumerate(categorical.values())})
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), values)
+    meta = {
+        'format': ARTIFACT_FORMAT,
+        'version': G.graph['version'],
+        'nodes': nodes,
+        'columns': list(columns),
+        'integer_columns': get_integer_columns(G, columns),
+        'categorical': {field: categories for field, (_, categories) in categorical.items()},
+        'connections': connections[1],
+        'timeline_movies': G.graph['timeline']['movies']
+    }
+    json.dump(meta, open(os.path.join(tmp_path, 'meta.json'), 'w'))
+    publish_artifact(path, G.graph['version'], tmp_path)
+
+
+def publish_artifact(path, version, tmp_path):
+    version_path = os.path.join(path, version)
+    # open memory maps of a replaced version stay valid until their graph is dropped
+    shutil.rmtree(version_path, ignore_errors=True)
+    os.replace(tmp_path, version_path)
+    current_tmp_path = os.path.join(path, f'CURRENT.tmp{os.getpid()}')
+    with open(current_tmp_path, 'w') as current_file:
+        current_file.write(version)
+    os.replace(current_tmp_path, os.path.join(path, 'CURRENT'))
+    prune_artifacts(path, version)
+
+
+def prune_artifacts(path, current, keep=KEEP_ARTIFACTS):
+    versions = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)) and '.tmp' not in name and name != current]
+    versions = sorted(versions, key=lambda name: os.path.getmtime(os.path.join(path, name)), reverse=True)
+    for version in versions[keep - 1:]:
+        shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+
+def get_current_version(path=ARTIFACT_DIR):
+    current_path = os.path.join(path, 'CURRENT')
+    if not os.path.exists(current_path):
+        return None
+    current_version = open(current_path, 'r').read().strip()
+    return current_version
+
+
+def get_attribute_table(G, nodes, categorical_fields=('is_instance',)):
+    fields = {field for _, data in G.nodes(data=True) for field in data}
+    numeric_fields = [field for field in sorted(fields) if is_numeric_field(G, field)]
+    table = pd.DataFrame({field: np.array([G.nodes[node].get(field, np.nan) for node in nodes], dtype=np.float64) for field in numeric_fields})
+    for field in categorical_fields:
+        table[field] = pd.Categorical([G.nodes[node].get(field) for node in nodes])
+    return table
+
+
+def get_field_values(G, field, node_type=None):
+    values = [data[field] for _, data in G.nodes(data=True) if field in data and (node_type is None or data.get('is_instance') == node_type)]
+    return values
+
+
+def is_numeric_field(G, field):
+    values = get_field_values(G, field)
+    is_numeric = all(isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)) for value in values)
+    return is_numeric
+
+
+def get_integer_columns(G, fields):
+    # per node type, a movie's scare counts are integers while a director's averages of them are not
+    node_types = sorted({data['is_instance'] for _, data in G.nodes(data=True) if 'is_instance' in data})
+    integer_columns = {node_type: [field for field in fields if is_integer_field(G, field, node_type)] for node_type in node_types}
+    return integer_columns
+
+
+def is_integer_field(G, field, node_type=None):
+    values = [value for value in get_field_values(G, field, node_type) if not pd.isnull(value)]
+    is_integer = bool(values) and all(isinstance(value, (int, np.integer)) for value in values)
+    return is_integer
+
+
+def encode_categorical(values):
+    categories = sorted(set(values))
+    mapping = {category: code for code, category in enumerate(categories)}
+    codes = np.array([mapping[value] for value in values], dtype=np.int8)
+    return codes, categories
+
+
+def get_edge_connections(G):
+    nodes = G.graph['nodes']
+    indptr, indices = G.graph['indptr'], G.graph['indices']
+    connections = [G.edges[nodes[row], nodes[col]]['connection'] for row in range(len(nodes)) for col in indices[indptr[row]:indptr[row + 1]]]
+    return connections
+
+
+def gather_rows(indptr, indices, rows):
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    gathered = indices[offsets + np.arange(lengths.sum())]
+    return gathered
+
+
+def get_upper_edges(indptr, indices):
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    upper = rows < indices
+    edges = np.stack([rows[upper], np.asarray(indices)[upper]], axis=1)
+    return edges, upper
+
+
+def read_artifact_version(path=ARTIFACT_DIR):
+    current_version = get_current_version(path)
+    meta_path = os.path.join(path, current_version or '', 'meta.json')
+    if current_version is None or not os.path.exists(meta_path):
+        return None
+    meta = json.load(open(meta_path, 'r'))
+    if meta.get('format') != ARTIFACT_FORMAT:
+        return None
+    return meta['version']
+
+
+@timed('load_graph_artifact')
+def load_graph_artifact(path=ARTIFACT_DIR):
+    # the attribute table stays a view of the memory-mapped columns, so the workers share its
+    # pages, and the node attribute dicts are only assembled for the nodes that are looked up
+    path = os.path.join(path, get_current_version(path))
+    meta = json.load(open(os.path.join(path, 'meta.json'), 'r'))
+    load_array = lambda name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+    nodes = meta['nodes']
+    node_ids = {node: i for i, node in enumerate(nodes)}
+    columns = load_array('columns')
+    table = pd.DataFrame(columns.T, columns=meta['columns'], copy=False)
+    categorical_codes = {}
+    for i, (field, categories) in enumerate(meta['categorical'].items()):
+        codes = categorical_codes[field] = load_array(f'categorical_{i}')
+        table[field] = pd.Categorical.from_codes(codes, categories)
+    G = nx.Graph()
+    G._node = ArtifactNodes(nodes, node_ids, dict(zip(meta['columns'], columns)), {node_type: set(fields) for node_type, fields in meta['integer_columns'].items()},
+                            {field: (codes, meta['categorical'][field]) for field, codes in categorical_codes.items()},
+                            load_array('attributes'), load_array('attribute_offsets'))
+    G._adj = {node: {} for node in nodes}
+    indptr, indices = load_array('indptr'), load_array('indices')
+    edges, upper = get_upper_edges(indptr, indices)
+    edge_connections = np.array(meta['connections'])[load_array('connections')[upper]]
+    G.add_edges_from((nodes[a], nodes[b], {'connection': connection}) for (a, b), connection in zip(edges, edge_connections))
+    G.graph.update({
+        'version': meta['version'],
+        'nodes': nodes,
+        'node_ids': node_ids,
+        'table': table,
+        'indptr': indptr,
+        'indices': indices,
+        'edges': edges,
+        'edge_connections': edge_connections,
+        'node_types': categorical_codes['is_instance'],
+        'hood_indptr': load_array('hood_indptr'),
+        'hood_indices': load_array('hood_indices'),
+        'similar_ids': load_array('similar_ids'),
+        'similar_scores': load_array('similar_scores'),
+        'timeline': {
+            'movies': meta['timeline_movies'],
+            'movie_ids': {movie: i for i, movie in enumerate(meta['timeline_movies'])},
+            'seconds': load_array('timeline_seconds'),
+            'offsets': load_array('timeline_offsets')
+        }
+    })
+    return G
+
+
+class ArtifactNodes(collections.abc.Mapping):
+    # the node attribute dicts of a loaded graph: a node's dict is assembled from its JSON
+    # attributes and the memory-mapped columns when it is first looked up. The nodes are fixed,
+    # adding or removing nodes fails like on any read-only mapping.
+    def __init__(self, nodes, node_ids, columns, integer_columns, categorical, attributes, attribute_offsets):
+        self.nodes = nodes
+        self.node_ids = node_ids
+        self.columns = columns
+        self.integer_columns = integer_columns
+        self.categorical = categorical
+        self.attributes = attributes
+        self.attribute_offsets = attribute_offsets
+        self.assembled = {}
+
+    def __getitem__(self, node):
+        data = self.assembled.get(node)
+        if data is None:
+            data = self.assembled[node] = self.assemble(self.node_ids[node])
+        return data
+
+    def __contains__(self, node):
+        return node in self.node_ids
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def assemble(self, node_id):
+        start, stop = self.attribute_offsets[node_id], self.attribute_offsets[node_id + 1]
+        data = json.loads(self.attributes[start:stop].tobytes().decode())
+        for field, (codes, categories) in self.categorical.items():
+            if codes[node_id] >= 0:
+                data[field] = categories[codes[node_id]]
+        integer_columns = self.integer_columns.get(data.get('is_instance'), ())
+        for field, values in self.columns.items():
+            value = values[node_id]
+            if not np.isnan(value):
+                data[field] = int(value) if field in integer_columns else float(value)
+            elif field in data:
+                data[field] = np.nan
+        return data
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import networkx as nx
+import numpy as np
+
+LAYOUT_DIR = 'data/layouts'
+LAYOUTS = {
+    'spring': {'k': 0.07, 'seed': 2, 'iterations': 50},
+    'fast': {'k': 0.07, 'seed': 2, 'iterations': 100}
+}
+# DATAVIZ_LAYOUT picks the layout the dashboard, plot_G and export draw: 'spring', 'fast' or 'auto',
+# which switches to the grid-approximated layout above SPRING_NODE_LIMIT nodes where the dense
+# spring layout gets slow. A graph can carry its own choice in G.graph['layout_method'].
+LAYOUT_METHOD = os.environ.get('DATAVIZ_LAYOUT', 'auto')
+SPRING_NODE_LIMIT = 3000
+
+
+def get_layout_method(G):
+    method = G.graph.get('layout_method', LAYOUT_METHOD)
+    if method == 'auto':
+        method = 'spring' if len(G) <= SPRING_NODE_LIMIT else 'fast'
+    return method
+
+
+def get_layout(G, method='spring'):
+    # a layout that was not built beforehand is computed once and stored for the next start
+    params = LAYOUTS[method]
+    path = get_layout_path(G, method, params)
+    if os.path.exists(path):
+        positions = np.load(path)
+        if len(positions) == len(G):
+            return positions
+    positions = build_layout(G, method)
+    return positions
+
+
+def build_layout(G, method='spring'):
+    params = LAYOUTS[method]
+    positions = compute_layout(G, method, params)
+    os.makedirs(LAYOUT_DIR, exist_ok=True)
+    path = get_layout_path(G, method, params)
+    tmp_path = f'{path}.tmp{os.getpid()}.npy'
+    np.save(tmp_path, positions)
+    os.replace(tmp_path, path)
+    return positions
+
+
+def get_layout_path(G, method, params):
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:10]
+    path = os.path.join(LAYOUT_DIR, f"{G.graph['version']}_{method}_{key}.npy")
+    return path
+
+
+def compute_layout(G, method, params):
+    if method == 'fast':
+        positions = fast_force_layout(G.graph['indptr'], G.graph['indices'], **params)
+    else:
+        pos = nx.spring_layout(G, **params)
+        positions = np.array([pos[node] for node in G.graph['nodes']])
+    return positions
+
+
+def fast_force_layout(indptr, indices, k=None, seed=2, iterations=100, grid=None):
+    # Fruchterman-Reingold with the repulsion approximated on a grid (particle-mesh): node masses
+    # are binned into grid cells and the pairwise k^2/d force becomes an FFT convolution,
+    # so each iteration costs O(n + edges + grid^2 log grid) instead of O(n^2).
+    n = len(indptr) - 1
+    rng = np.random.RandomState(seed)
+    pos = rng.rand(n, 2)
+    if k is None:
+        k = np.sqrt(1 / n)
+    if grid is None:
+        grid = int(np.clip(2 * np.sqrt(n), 64, 512))
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    upper = rows < indices
+    a, b = rows[upper], np.asarray(indices)[upper]
+    kernels = get_repulsion_kernels(grid)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        displacement = get_grid_repulsion(pos, k, grid, kernels) + get_attraction(pos, a, b, k)
+        length = np.linalg.norm(displacement, axis=1)
+        length = np.where(length < 0.01, 0.1, length)
+        pos += displacement * (temperature / length)[:, None]
+        temperature -= cooling
+    pos -= pos.mean(axis=0)
+    pos /= np.abs(pos).max()
+    return pos
+
+
+def get_repulsion_kernels(grid):
+    offsets = np.fft.fftfreq(2 * grid, 1 / (2 * grid))
+    dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+    distance2 = dx ** 2 + dy ** 2
+    distance2[0, 0] = np.inf
+    kernels = np.fft.rfft2(dx / distance2), np.fft.rfft2(dy / distance2)
+    return kernels
+
+
+def get_grid_repulsion(pos, k, grid, kernels):
+    low = pos.min(axis=0)
+    cell_size = max((pos.max(axis=0) - low).max(), 1e-9) / grid
+    cells = np.minimum(((pos - low) / cell_size).astype(np.int64), grid - 1)
+    flat_cells = cells[:, 0] * grid + cells[:, 1]
+    mass = np.bincount(flat_cells, minlength=grid * grid).reshape(grid, grid)
+    mass_hat = np.fft.rfft2(mass, s=(2 * grid, 2 * grid))
+    fields = [np.fft.irfft2(mass_hat * kernel, s=(2 * grid, 2 * grid))[:grid, :grid].ravel() for kernel in kernels]
+    repulsion = np.stack([field[flat_cells] for field in fields], axis=1) * k ** 2 / cell_size
+    return repulsion
+
+
+def get_attraction(pos, a, b, k):
+    delta = pos[a] - pos[b]
+    force = delta * (np.linalg.norm(delta, axis=1) / k)[:, None]
+    attraction = np.stack([np.bincount(b, force[:, i], len(pos)) - np.bincount(a, force[:, i], len(pos)) for i in range(2)], axis=1)
+    return attraction
@@ -1,10 +1,35 @@
+from src.metrics import timed
+from src.similarity import get_similar_movies
+from src.timeline import get_histogram
+
+
+@timed('get_markdown_info')
 def get_markdown_info(G, node):
     if node:
         title = f"#### {node}"
         info = G.node[node]
         text_info_list = [f"##### {field}:\n{value}" for field, value in info.items()]
+        text_info_list.append(get_timeline_info(G, node))
+        if info['is_instance'] == 'movie':
+            text_info_list.append(get_similarity_info(G, node))
         text_info = '\n'.join(text_info_list)
         markdown_info = title + '\n' + text_info
     else:
         markdown_info = None
-    return markdown_info
\ No newline at end of file
+    return markdown_info
+
+
+def get_timeline_info(G, node):
+    if G.node[node]['is_instance'] == 'movie':
+        movies = [node]
+    else:
+        movies = list(G.adj[node])
+    histogram = get_histogram(G.graph['timeline'], movies)
+    timeline_info = '##### Scares per 10 minutes:\n' + ' '.join(str(count) for count in histogram)
+    return timeline_info
+
+
+def get_similarity_info(G, node):
+    similar_movies = get_similar_movies(G, node)
+    similarity_info = '##### Similar movies:\n' + '\n'.join(f'{movie} ({score:.2f})' for movie, score in similar_movies)
+    return similarity_info
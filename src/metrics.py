@@ -0,0 +1,131 @@
+import bisect
+import cProfile
+import functools
+import os
+import random
+import sys
+import threading
+import time
+
+# opt-in: DATAVIZ_METRICS=1 records stage durations and dashboard payload sizes into histograms
+# served on /metrics, DATAVIZ_PROFILE_RATE profiles that fraction of dashboard requests and keeps
+# the profiles of those slower than DATAVIZ_PROFILE_THRESHOLD seconds in PROFILE_DIR.
+# Histograms live in each worker's memory, so /metrics reports the worker that answered it.
+ENABLED = os.environ.get('DATAVIZ_METRICS') == '1'
+PROFILE_RATE = float(os.environ.get('DATAVIZ_PROFILE_RATE', 0))
+PROFILE_THRESHOLD = float(os.environ.get('DATAVIZ_PROFILE_THRESHOLD', 1))
+PROFILE_DIR = 'data/profiles'
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = tuple(2 ** i for i in range(10, 28, 2))
+DASH_UPDATE_PATH = '_dash-update-component'
+
+histograms = {}
+histograms_lock = threading.Lock()
+
+
+def observe(name, labels, value, buckets=SECONDS_BUCKETS):
+    with histograms_lock:
+        histogram = histograms.setdefault((name, labels), {'buckets': buckets, 'counts': [0] * (len(buckets) + 1), 'sum': 0.0})
+        histogram['counts'][bisect.bisect_left(buckets, value)] += 1
+        histogram['sum'] += value
+
+
+def timed(stage):
+    # a no-op unless metrics are enabled at import, so the instrumented functions stay untouched
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # only the outermost stage of a request counts towards its callback time. flask is only
+            # loaded by the dashboard, so without it there is no request and the CLI never imports it
+            flask = sys.modules.get('flask')
+            outermost = flask is not None and flask.has_request_context() and not flask.g.get('in_stage')
+            if outermost:
+                flask.g.in_stage = True
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                observe('stage_seconds', f'stage="{stage}"', duration)
+                if outermost:
+                    flask.g.in_stage = False
+                    flask.g.stage_seconds = flask.g.get('stage_seconds', 0) + duration
+        return wrapper
+    return decorator
+
+
+def init_app(server):
+    server.add_url_rule('/metrics', 'metrics', get_metrics_response)
+    if ENABLED or PROFILE_RATE:
+        server.before_request(start_request)
+        server.after_request(finish_request)
+
+
+def start_request():
+    from flask import g, request
+    if not request.path.endswith(DASH_UPDATE_PATH):
+        return
+    g.request_start = time.perf_counter()
+    if PROFILE_RATE and random.random() < PROFILE_RATE:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def finish_request(response):
+    from flask import g
+    if 'request_start' not in g:
+        return response
+    duration = time.perf_counter() - g.request_start
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if duration > PROFILE_THRESHOLD:
+            dump_profile(profiler, duration)
+    if ENABLED:
+        labels = f'output="{get_request_output()}"'
+        observe('request_seconds', labels, duration)
+        observe('response_bytes', labels, response.content_length or 0, BYTES_BUCKETS)
+        # whatever the callback's stages did not spend is Dash dispatching and serialising the output
+        observe('serialize_seconds', labels, max(duration - g.get('stage_seconds', 0), 0))
+    return response
+
+
+def get_request_output():
+    from flask import request
+    payload = request.get_json(silent=True) or {}
+    output = payload.get('output', 'unknown').strip('.')
+    return output
+
+
+def dump_profile(profiler, duration):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}_{os.getpid()}_{duration * 1000:.0f}ms.prof')
+    profiler.dump_stats(path)
+    return path
+
+
+def get_metrics_response():
+    from flask import Response
+    return Response(get_metrics_text(), mimetype='text/plain; version=0.0.4')
+
+
+def get_metrics_text():
+    # Prometheus text exposition format
+    with histograms_lock:
+        snapshot = {key: dict(histogram, counts=list(histogram['counts'])) for key, histogram in histograms.items()}
+    lines = []
+    for name in sorted({name for name, _ in snapshot}):
+        metric = f'dataviz_{name}'
+        lines.append(f'# TYPE {metric} histogram')
+        for (_, labels), histogram in sorted((key, value) for key, value in snapshot.items() if key[0] == name):
+            cumulative = 0
+            for bound, count in zip(list(histogram['buckets']) + ['+Inf'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+    metrics_text = '\n'.join(lines) + '\n'
+    return metrics_text
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+
+PAGE_DIR = 'data/pages'
+INDEX_PATH = os.path.join(PAGE_DIR, 'index.json')
+
+
+def load_page_index():
+    if os.path.exists(INDEX_PATH):
+        page_index = json.load(open(INDEX_PATH, 'r'))
+    else:
+        page_index = {}
+    return page_index
+
+
+def save_page_index(page_index):
+    os.makedirs(PAGE_DIR, exist_ok=True)
+    tmp_path = INDEX_PATH + '.tmp'
+    json.dump(page_index, open(tmp_path, 'w'), indent=1)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def get_page_path(link):
+    name = hashlib.sha1(link.encode()).hexdigest()
+    page_path = os.path.join(PAGE_DIR, name + '.html')
+    return page_path
+
+
+def has_page(link):
+    return os.path.exists(get_page_path(link))
+
+
+def load_page(link):
+    content = open(get_page_path(link), 'rb').read()
+    return content
+
+
+def get_conditional_headers(page_index, link):
+    entry = page_index.get(link, {})
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def store_page(page_index, link, res):
+    content_hash = hashlib.sha1(res.content).hexdigest()
+    changed = page_index.get(link, {}).get('hash') != content_hash
+    if changed or not has_page(link):
+        os.makedirs(PAGE_DIR, exist_ok=True)
+        open(get_page_path(link), 'wb').write(res.content)
+    page_index[link] = {
+        'etag': res.headers.get('ETag'),
+        'last_modified': res.headers.get('Last-Modified'),
+        'hash': content_hash
+    }
+    return changed
@@ -0,0 +1,49 @@
+import base64
+import numpy as np
+
+# dashboard payloads carry numeric arrays as base64 little-endian typed arrays that
+# assets/graph.js decodes, floats as float32 rounded to ROUND_DIGITS significant digits of the
+# array's extent so that the repeated digits compress well
+ROUND_DIGITS = 4
+
+
+def encode_payload(value):
+    if isinstance(value, np.ndarray):
+        return encode_array(value)
+    if isinstance(value, dict):
+        return {key: encode_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(encode_payload(item) for item in value)
+    return value
+
+
+def encode_array(values):
+    if values.dtype.kind in 'iub':
+        values, dtype = values.astype('<i4'), 'int32'
+    elif values.dtype.kind == 'f':
+        values, dtype = round_relative(values).astype('<f4'), 'float32'
+    else:
+        return values.tolist()
+    encoded = {
+        'dtype': dtype,
+        'shape': list(values.shape),
+        'data': base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')
+    }
+    return encoded
+
+
+def decode_array(encoded):
+    values = np.frombuffer(base64.b64decode(encoded['data']), dtype='<i4' if encoded['dtype'] == 'int32' else '<f4').reshape(encoded['shape'])
+    return values
+
+
+def round_relative(values, digits=ROUND_DIGITS):
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return values
+    scale = (finite.max() - finite.min()) or np.abs(finite).max()
+    if not scale:
+        return values
+    step = 10.0 ** (np.floor(np.log10(scale)) - digits)
+    rounded = np.round(values / step) * step
+    return rounded
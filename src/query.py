@@ -0,0 +1,110 @@
+import numpy as np
+from src.graph_store import gather_rows
+
+RANGE_FIELDS = ['Year', 'imdb', 'tomato', 'Scare Rating']
+NETFLIX_FIELD = 'Netflix (US)'
+# imdb and tomato are stored in [0, 1] but entered out of 10 and out of 100
+DISPLAY_SCALES = {'imdb': 10, 'tomato': 100}
+
+
+def make_query(ranges=None, tags=None, directors=None, netflix=None):
+    # the dashboard filters in a canonical, hashable form so they can be part of a cache key,
+    # None when nothing is filtered
+    query = [(field, (low, high)) for field, (low, high) in sorted((ranges or {}).items()) if low is not None or high is not None]
+    if tags:
+        query.append(('tags', tuple(sorted(tags))))
+    if directors:
+        query.append(('directors', tuple(sorted(directors))))
+    if netflix is not None:
+        query.append(('netflix', bool(netflix)))
+    return tuple(query) or None
+
+
+def get_min_ranges(minimums):
+    # minimums as entered on the dashboard or the command line, zero or None means no filter
+    ranges = {field: (minimum / DISPLAY_SCALES.get(field, 1) if minimum else None, None) for field, minimum in minimums.items()}
+    return ranges
+
+
+def get_query(G, year_range, tags, directors, min_imdb, min_tomato, min_scare, netflix):
+    # the dashboard's and the graph command's filters: the full year range and zero thresholds
+    # mean no filter, so movies missing a field stay in. netflix is 'yes', 'no' or 'any' from the
+    # dashboard and True, False or None from the command line.
+    year_range = tuple(year_range or ())
+    ranges = get_min_ranges({'imdb': min_imdb, 'tomato': min_tomato, 'Scare Rating': min_scare})
+    ranges['Year'] = (None, None) if year_range in [(), get_year_bounds(G)] else year_range
+    query = make_query(ranges, tags, directors, {'yes': True, 'no': False, 'any': None}.get(netflix, netflix))
+    return query
+
+
+def get_year_bounds(G):
+    bounds = get_range_bounds(G, 'Year') or (1900, 2020)
+    year_bounds = (int(bounds[0]), int(bounds[1]))
+    return year_bounds
+
+
+def get_query_index(G):
+    # built once per loaded graph: every range field sorted with the node ids in that order, so a
+    # range is two binary searches, and a bitmap of the movies available on Netflix
+    if 'query_index' not in G.graph:
+        table = G.graph['table']
+        sorted_fields = {}
+        for field in RANGE_FIELDS:
+            if field not in table:
+                continue
+            values = table[field].values
+            order = np.argsort(values, kind='stable')
+            order = order[~np.isnan(values[order])]
+            sorted_fields[field] = (values[order], order)
+        G.graph['query_index'] = {
+            'sorted': sorted_fields,
+            'movies': (table['is_instance'] == 'movie').values,
+            'netflix': (table[NETFLIX_FIELD] == 'Yes').values if NETFLIX_FIELD in table else np.zeros(len(table), dtype=bool)
+        }
+    return G.graph['query_index']
+
+
+def get_query_mask(G, query):
+    # the matching movies plus their directors and tags, so the induced subgraph keeps their links
+    if not query:
+        return None
+    index = get_query_index(G)
+    movies = index['movies'].copy()
+    for key, value in query:
+        if key in index['sorted']:
+            movies &= get_range_mask(index['sorted'][key], value, len(movies))
+        elif key == 'tags':
+            for tag in value:
+                movies &= get_linked_mask(G, [tag])
+        elif key == 'directors':
+            movies &= get_linked_mask(G, value)
+        elif key == 'netflix':
+            movies &= index['netflix'] == value
+    mask = movies.copy()
+    mask[gather_rows(G.graph['indptr'], G.graph['indices'], np.flatnonzero(movies))] = True
+    return mask
+
+
+def get_range_mask(sorted_field, value_range, size):
+    values, order = sorted_field
+    low, high = value_range
+    start = 0 if low is None else np.searchsorted(values, low, side='left')
+    stop = len(values) if high is None else np.searchsorted(values, high, side='right')
+    mask = np.zeros(size, dtype=bool)
+    mask[order[start:stop]] = True
+    return mask
+
+
+def get_linked_mask(G, nodes):
+    node_ids = np.array([G.graph['node_ids'][node] for node in nodes if node in G.graph['node_ids']], dtype=np.int64)
+    mask = np.zeros(len(G.graph['nodes']), dtype=bool)
+    mask[gather_rows(G.graph['indptr'], G.graph['indices'], node_ids)] = True
+    return mask
+
+
+def get_range_bounds(G, field):
+    values, _ = get_query_index(G)['sorted'].get(field, ([], None))
+    if not len(values):
+        return None
+    bounds = (values[0], values[-1])
+    return bounds
@@ -0,0 +1,88 @@
+import collections
+import fcntl
+import os
+import threading
+import time
+import traceback
+from src.graph import build_graph, get_data_stamp, get_data_version
+from src.graph_store import ARTIFACT_DIR, load_graph_artifact, read_artifact_version, save_graph_artifact
+
+# every RELOAD_INTERVAL seconds a request compares the data files' stamp with the one the live
+# graph was loaded from. On a change the new graph is loaded (or built once and published for the
+# other workers) and warmed in a background thread, then swapped in. The last KEEP_GRAPHS graphs
+# stay available so open pages keep being served from the version they were rendered with.
+RELOAD_INTERVAL = 5
+KEEP_GRAPHS = 2
+BUILD_LOCK_PATH = os.path.join(ARTIFACT_DIR, 'build.lock')
+
+graphs = collections.OrderedDict()
+graphs_lock = threading.Lock()
+reload_state = {'stamp': None, 'checked': 0.0, 'reloading': False}
+
+
+def get_live_graph(version=None, warm=None):
+    if not graphs:
+        load_first_graph(warm)
+    check_for_update(warm)
+    with graphs_lock:
+        G = graphs[version] if version in graphs else next(reversed(graphs.values()))
+    return G
+
+
+def load_first_graph(warm=None):
+    with graphs_lock:
+        if graphs:
+            return
+        stamp = get_data_stamp()
+        G = get_published_graph()
+        if warm:
+            warm(G)
+        graphs[G.graph['version']] = G
+        reload_state.update(stamp=stamp, checked=time.monotonic())
+
+
+def check_for_update(warm=None):
+    now = time.monotonic()
+    if now - reload_state['checked'] < RELOAD_INTERVAL or reload_state['reloading']:
+        return
+    with graphs_lock:
+        if now - reload_state['checked'] < RELOAD_INTERVAL or reload_state['reloading']:
+            return
+        reload_state['checked'] = now
+        stamp = get_data_stamp()
+        if stamp == reload_state['stamp']:
+            return
+        reload_state['reloading'] = True
+    threading.Thread(target=reload_graph, args=(stamp, warm), daemon=True).start()
+
+
+def reload_graph(stamp, warm=None):
+    try:
+        G = get_published_graph()
+        if G.graph['version'] not in graphs and warm:
+            warm(G)
+        with graphs_lock:
+            graphs.setdefault(G.graph['version'], G)
+            graphs.move_to_end(G.graph['version'])
+            while len(graphs) > KEEP_GRAPHS:
+                graphs.popitem(last=False)
+            reload_state['stamp'] = stamp
+    except Exception:
+        # half-written data is retried on the next check, the live graph keeps serving meanwhile
+        traceback.print_exc()
+    finally:
+        reload_state['reloading'] = False
+
+
+def get_published_graph():
+    # like get_graph, but a stale artifact is rebuilt by one worker while the others wait for it
+    # and then map the same files
+    version = get_data_version()
+    if read_artifact_version() != version:
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        with open(BUILD_LOCK_PATH, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if read_artifact_version() != version:
+                save_graph_artifact(build_graph())
+    G = load_graph_artifact()
+    return G
@@ -1,9 +1,22 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import pandas as pd
-import functools
+import collections
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
 from tqdm import tqdm
 import json
+import os
+from src.page_store import load_page_index, save_page_index, has_page, load_page, get_conditional_headers, store_page
+from src.storage import DETAILS_PATH, append_to_store, close_store_writers, open_store_writers
+
+SITE = 'https://wheresthejump.com'
+MAIN_PAGE = SITE + '/full-movie-list/'
+JUMP_RATING_COLUMNS = {'Jump Scare Rating': 'Scare Rating', 'Netflix (US)': 'Netflix (US)'}
 
 
 def scrape():
@@ -15,15 +28,8 @@ def scrape():
     save_data_details(data_details)
 
 
-def get_main_page():
-    res = requests.get('https://wheresthejump.com/full-movie-list/')
-    soup = BeautifulSoup(res.content, 'lxml')
-    return soup
-
-
-@functools.lru_cache(600)
-def get_soup(link):
-    res = requests.get(link)
+def get_main_page(url=MAIN_PAGE):
+    res = requests.get(url)
     soup = BeautifulSoup(res.content, 'lxml')
     return soup
 
@@ -38,89 +44,290 @@ def save_jumpscares(jumpscares):
     jumpscares.to_csv('data/jumpscares.csv')
 
 
-def get_links(soup):
-    all_links = soup.find_all('a')
-    pattern = "https://wheresthejump.com/jump-scares"
-    good_links = [link.get('href') for link in all_links if pattern in link.get('href')]
+def get_site(url):
+    parsed = urlparse(url)
+    site = f'{parsed.scheme}://{parsed.netloc}'
+    return site
+
+
+def get_links(soup, site=SITE):
+    all_links = [rebase_link(urljoin(site, link.get('href', '')), site) for link in soup.find_all('a')]
+    pattern = site + '/jump-scares'
+    good_links = [link for link in all_links if pattern in link]
     good_links = good_links[1:]
     return good_links
 
 
-def get_detailed_data(good_links):
-    data_details = dict()
-    for link in tqdm(good_links):
-        soup = get_soup(link)
-        movie = soup.find('h1').getText().replace('Jump Scares In', '')
-        content_part = soup.find('div', class_='entry-content')
-        all_info = content_part.find_all('p')[:-3]
-        data_details[movie] = dict()
-        data_details[movie]['link'] = link
-        data_details[movie]['scare'] = {}
-        for info in all_info:
-            contents = info.contents
-            num_of_contents = len(info.contents)
-            if 'Tags:' in str(info):
-                field = 'Tags'
-                value = [content.getText().strip() for content in contents if 'a href' in str(content)]
-                data_details[movie][field] = value
-            elif 'peekaboo_content' in str(info):
-                scare_contents = info.getText().replace('-', '–').split('–')
-                timestamp = scare_contents[0].strip()
-                description = scare_contents[1].strip()
-                major = '<strong>' in str(contents[0])
-                data_details[movie]['scare'][timestamp] = {}
-                data_details[movie]['scare'][timestamp]['desc'] = description
-                data_details[movie]['scare'][timestamp]['major'] = major
-            elif ('imdb.com' in str(info)) |('Rotten Tomatoes:' in str(info)):
-                imdb = info.contents[1].strip()
-                tomato = info.contents[3].strip()
-                data_details[movie]['imdb'] = imdb
-                data_details[movie]['tomato'] = tomato
-            elif num_of_contents > 1:
-                try:
-                    field = contents[0].getText().replace(':', '').strip()
-                    value = contents[1].strip()
-                except:
-                    if ':' in info.getText()[1:3]:
-                        scare_contents = info.getText().replace('-', '–').split('–')
-                        timestamp = scare_contents[0].strip()
-                        description = scare_contents[1].strip()
-                        major = '<strong>' in str(contents[0])
-                        data_details[movie]['scare'][timestamp] = {}
-                        data_details[movie]['scare'][timestamp]['desc'] = description
-                        data_details[movie]['scare'][timestamp]['major'] = major
-                    elif ':' in str(info):
-                        field, value = info.getText().split(':')
-                    else:
-                        print(f'{movie} - nothing found in {str(info)}')
-                data_details[movie][field] = value
-            elif ':' in info.getText()[1:3]:
-                scare_contents = info.getText().replace('-', '–').split('–')
-                timestamp = scare_contents[0].strip()
-                description = scare_contents[1].strip()
-                major = '<strong>' in str(contents[0])
-                data_details[movie]['scare'][timestamp] = {}
-                data_details[movie]['scare'][timestamp]['desc'] = description
-                data_details[movie]['scare'][timestamp]['major'] = major
-            else:
-                print(f'{movie} - nothing found in {str(info)}')
+def rebase_link(link, site):
+    # saved pages link to the live site with absolute urls, those are moved onto the site being
+    # scraped so that a local copy can stand in for it
+    if urlparse(link).netloc.replace('www.', '') == urlparse(SITE).netloc:
+        link = site + link[len(get_site(link)):]
+    return link
+
+
+def get_detailed_data(good_links, workers=1, rate=None, retries=3, backoff=0.5):
+    page_index = load_page_index()
+    pages, _ = fetch_pages(good_links, page_index, workers, rate, retries, backoff)
+    data_details = parse_pages(pages, [link for link in good_links if link in pages])
     return data_details
 
+
+def scrape_to_store(good_links, jumpscares, workers=1, rate=None, retries=3, backoff=0.5, batch_size=100):
+    # every page is parsed as it arrives and written to data/data_details.json, and the parsed
+    # movies go to the Parquet store in batches, so neither the pages nor the details of the whole
+    # catalog are held in memory. Both only replace the previous files once the scrape finished.
+    from src.graph import get_movie_tables
+    ratings = get_link_fields(jumpscares, JUMP_RATING_COLUMNS)
+    page_index = load_page_index()
+    writers = open_store_writers()
+    tmp_path = DETAILS_PATH + '.tmp'
+    parsed_links = set()
+    with open(tmp_path, 'w') as details_file:
+        details_file.write('{')
+        batch = {}
+
+        def add_movie(movie, details):
+            details.update(ratings.get(details['link'], {}))
+            details_file.write((', ' if parsed_links else '') + json.dumps(movie) + ': ' + json.dumps(details))
+            parsed_links.add(details['link'])
+            batch[movie] = details
+            if len(batch) == batch_size:
+                append_to_store(writers, get_movie_tables(batch))
+                batch.clear()
+
+        for link, content, _ in iter_pages(good_links, page_index, workers, rate, retries, backoff):
+            add_movie(*parse_detail_page(link, content))
+        # known movies whose page could neither be fetched nor read from data/pages keep their
+        # previous details, so a bad run does not drop them from the catalog
+        missing = set(good_links) - parsed_links
+        if missing:
+            for movie, details in load_data_details().items():
+                if details['link'] in missing:
+                    add_movie(movie, details)
+        if batch:
+            append_to_store(writers, get_movie_tables(batch))
+        details_file.write('}')
+    close_store_writers(writers)
+    os.replace(tmp_path, DETAILS_PATH)
+    report_unmatched([link for link in ratings if link not in parsed_links])
+
+
+def get_incremental_data(good_links, data_details, recheck=False, workers=1, rate=None, retries=3, backoff=0.5):
+    known_links = {data['link'] for data in data_details.values()}
+    if recheck:
+        links = good_links
+    else:
+        links = [link for link in good_links if link not in known_links]
+    page_index = load_page_index()
+    pages, changed = fetch_pages(links, page_index, workers, rate, retries, backoff)
+    # known movies whose page could not be fetched keep their previous details
+    links_to_parse = [link for link in links if link in pages and (link not in known_links or link in changed)]
+    print(f'{len(links)} pages requested, {len(links_to_parse)} new or changed')
+    current_links = set(good_links) - set(links_to_parse)
+    merged_details = {movie: data for movie, data in data_details.items() if data['link'] in current_links}
+    merged_details.update(parse_pages(pages, links_to_parse))
+    return merged_details
+
+
+def parse_pages(pages, links, workers=1):
+    contents = [pages[link] for link in links]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(parse_detail_page, links, contents, chunksize=16))
+    else:
+        parsed = [parse_detail_page(link, content) for link, content in zip(links, contents)]
+    data_details = dict(parsed)
+    return data_details
+
+
+def parse_stored_pages(links, workers=1):
+    pages = {link: load_page(link) for link in links}
+    data_details = parse_pages(pages, links, workers)
+    return data_details
+
+
+def get_session(pool_size=8, retries=3, backoff=0.5):
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_rate_limiter(rate=None):
+    interval = 1 / rate if rate else 0
+    next_slots = collections.defaultdict(float)
+    lock = threading.Lock()
+
+    def wait(link):
+        host = urlparse(link).netloc
+        with lock:
+            now = time.monotonic()
+            slot = max(now, next_slots[host])
+            next_slots[host] = slot + interval
+        time.sleep(slot - now)
+    return wait
+
+
+def fetch_page(session, link, wait, page_index):
+    # a page whose stored copy went missing is fetched in full, a 304 would leave nothing to read
+    headers = get_conditional_headers(page_index, link) if has_page(link) else {}
+    wait(link)
+    res = session.get(link, headers=headers, timeout=30)
+    if res.status_code == 304:
+        return load_page(link), False
+    res.raise_for_status()
+    changed = store_page(page_index, link, res)
+    return res.content, changed
+
+
+def fetch_pages(links, page_index, workers=1, rate=None, retries=3, backoff=0.5):
+    pages, changed = {}, set()
+    for link, content, link_changed in iter_pages(links, page_index, workers, rate, retries, backoff):
+        pages[link] = content
+        if link_changed:
+            changed.add(link)
+    return pages, changed
+
+
+def iter_pages(links, page_index, workers=1, rate=None, retries=3, backoff=0.5):
+    # yields link, content and whether it changed for every fetched page, in the order of links
+    session = get_session(workers, retries, backoff)
+    wait = get_rate_limiter(rate)
+
+    def fetch(link):
+        # a missing page or an exhausted retry only loses that page, the others are still fetched,
+        # and a page stored by an earlier run is read from data/pages instead
+        try:
+            content, changed = fetch_page(session, link, wait, page_index)
+            return content, changed, None
+        except requests.RequestException as error:
+            return load_page(link) if has_page(link) else None, False, error
+
+    failed = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = map_bounded(executor, fetch, links, workers * 2)
+            for link, (content, changed, error) in zip(links, tqdm(results, total=len(links))):
+                if error is not None:
+                    failed[link] = f'{error} (stored copy used)' if content is not None else error
+                if content is not None:
+                    yield link, content, changed
+    finally:
+        # pages already written to data/pages keep their index entries even when the run fails,
+        # so the next incremental run does not download them again
+        session.close()
+        save_page_index(page_index)
+    if failed:
+        print(f'{len(failed)} pages could not be fetched:\n' + '\n'.join(f'{link}: {error}' for link, error in failed.items()))
+
+
+def map_bounded(executor, fn, items, limit):
+    # like executor.map, but submits at most limit calls ahead of the results taken so far, so
+    # fetched pages do not pile up in memory when fetching is faster than parsing
+    pending = collections.deque()
+    for item in items:
+        if len(pending) == limit:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def parse_detail_page(link, content):
+    soup = BeautifulSoup(content, 'lxml')
+    movie = soup.find('h1').getText().replace('Jump Scares In', '')
+    content_part = soup.find('div', class_='entry-content')
+    all_info = content_part.find_all('p')[:-3]
+    details = {'link': link, 'scare': {}}
+    for info in all_info:
+        kind, field, value = classify_info(info)
+        if kind == 'scare':
+            details['scare'][field] = value
+        elif kind == 'ratings':
+            details.update(value)
+        elif kind == 'field':
+            details[field] = value
+        else:
+            print(f'{movie} - nothing found in {value}')
+    return movie, details
+
+
+def classify_info(info):
+    html = str(info)
+    contents = info.contents
+    text = info.getText()
+    if 'Tags:' in html:
+        value = [content.getText().strip() for content in contents if 'a href' in str(content)]
+        return 'field', 'Tags', value
+    elif 'peekaboo_content' in html:
+        return parse_scare(contents, text)
+    elif ('imdb.com' in html) | ('Rotten Tomatoes:' in html):
+        value = {'imdb': contents[1].strip(), 'tomato': contents[3].strip()}
+        return 'ratings', None, value
+    elif len(contents) > 1:
+        try:
+            field = contents[0].getText().replace(':', '').strip()
+            value = contents[1].strip()
+            return 'field', field, value
+        except Exception:
+            if ':' in text[1:3]:
+                return parse_scare(contents, text)
+            elif ':' in html:
+                field, value = text.split(':')
+                return 'field', field, value
+    elif ':' in text[1:3]:
+        return parse_scare(contents, text)
+    return 'unknown', None, html
+
+
+def parse_scare(contents, text):
+    scare_contents = text.replace('-', '–').split('–')
+    timestamp = scare_contents[0].strip()
+    description = scare_contents[1].strip()
+    major = '<strong>' in str(contents[0])
+    return 'scare', timestamp, {'desc': description, 'major': major}
+
+
 def add_jump_ratings(data_details, jumpscares):
-    for id, row in jumpscares[['link', 'Jump Scare Rating']].iterrows():
-        movie = get_movie_by_link(row.link, data_details)
-        data_details[movie]['Scare Rating'] = row['Jump Scare Rating']
+    data_details, _ = join_details(data_details, jumpscares, JUMP_RATING_COLUMNS)
     return data_details
 
-def get_movie_by_link(link, data_details):
-    movie = [movie for movie, data in data_details.items() if data['link'] == link][0]
-    return movie
+
+def join_details(data_details, table, columns, on='link'):
+    movie_by_link = {data['link']: movie for movie, data in data_details.items()}
+    unmatched = []
+    for link, fields in get_link_fields(table, columns, on).items():
+        movie = movie_by_link.get(link)
+        if movie is None:
+            unmatched.append(link)
+            continue
+        data_details[movie].update(fields)
+    report_unmatched(unmatched)
+    return data_details, unmatched
+
+
+def get_link_fields(table, columns, on='link'):
+    if not isinstance(columns, dict):
+        columns = {column: column for column in columns}
+    records = table[list(columns)].astype(object).to_dict('records')
+    link_fields = {link: {field: record[column] for column, field in columns.items()} for link, record in zip(table[on], records)}
+    return link_fields
+
+
+def report_unmatched(unmatched):
+    if unmatched:
+        print(f'{len(unmatched)} links have no detail page:\n' + '\n'.join(unmatched))
 
 
 def save_data_details(data_details):
-    json.dump(data_details, open('data/data_details.json', 'w'))
+    json.dump(data_details, open(DETAILS_PATH, 'w'))
 
 
 def load_data_details():
-    data_details = json.load(open('data/data_details.json', 'r'))
-    return data_details
\ No newline at end of file
+    if not os.path.exists(DETAILS_PATH):
+        return {}
+    data_details = json.load(open(DETAILS_PATH, 'r'))
+    return data_details
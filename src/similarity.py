@@ -0,0 +1,52 @@
+import numpy as np
+from src.graph_store import gather_rows
+from src.metrics import timed
+
+SIMILARITY_FIELDS = ['imdb', 'tomato', 'Jump Scares', 'Runtime', 'Scare Rating']
+
+
+@timed('index_similar_movies')
+def index_similar_movies(G, k=10, link_weight=0.5):
+    # movies are compared with every movie they share a director or tag with: Jaccard over the
+    # shared links plus cosine similarity of the standardised numeric fields
+    table = G.graph['table']
+    indptr, indices = G.graph['indptr'], G.graph['indices']
+    is_movie = (table['is_instance'] == 'movie').values
+    features = get_standardized_features(table, is_movie)
+    degrees = np.diff(indptr)
+    similar_ids = np.full((len(table), k), -1, dtype=np.int32)
+    similar_scores = np.full((len(table), k), np.nan, dtype=np.float32)
+    for movie_id in np.flatnonzero(is_movie):
+        links = indices[indptr[movie_id]:indptr[movie_id + 1]]
+        candidates, shared = np.unique(gather_rows(indptr, indices, links), return_counts=True)
+        keep = (candidates != movie_id) & is_movie[candidates]
+        candidates, shared = candidates[keep], shared[keep]
+        if not len(candidates):
+            continue
+        jaccard = shared / (degrees[movie_id] + degrees[candidates] - shared)
+        cosine = features[candidates] @ features[movie_id]
+        scores = link_weight * jaccard + (1 - link_weight) * (cosine + 1) / 2
+        top = np.argsort(-scores, kind='stable')[:k]
+        similar_ids[movie_id, :len(top)] = candidates[top]
+        similar_scores[movie_id, :len(top)] = scores[top]
+    G.graph['similar_ids'] = similar_ids
+    G.graph['similar_scores'] = similar_scores
+
+
+def get_standardized_features(table, is_movie, fields=SIMILARITY_FIELDS):
+    values = table[fields].values.astype(np.float64)
+    movie_values = values[is_movie]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features = (values - np.nanmean(movie_values, axis=0)) / np.nanstd(movie_values, axis=0)
+    features = np.nan_to_num(features)
+    norms = np.linalg.norm(features, axis=1)
+    features /= np.where(norms > 0, norms, 1)[:, None]
+    return features
+
+
+def get_similar_movies(G, node):
+    node_id = G.graph['node_ids'][node]
+    similar_ids = G.graph['similar_ids'][node_id]
+    similar_scores = G.graph['similar_scores'][node_id]
+    similar_movies = [(G.graph['nodes'][similar_id], float(score)) for similar_id, score in zip(similar_ids, similar_scores) if similar_id >= 0]
+    return similar_movies
@@ -0,0 +1,95 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DETAILS_PATH = 'data/data_details.json'
+STORE_DIR = 'data/store'
+SCHEMAS = {
+    'movies': pa.schema([
+        ('movie', pa.string()),
+        ('link', pa.string()),
+        ('Synopsis', pa.string()),
+        ('Director', pa.string()),
+        ('Runtime', pa.float64()),
+        ('MPAA Rating', pa.string()),
+        ('imdb', pa.float64()),
+        ('tomato', pa.float64()),
+        ('Netflix (US)', pa.string()),
+        ('Jump Scares', pa.float64()),
+        ('Major Jump Scares', pa.float64()),
+        ('Minor Jump Scares', pa.float64()),
+        ('Jump Scare Rating', pa.string()),
+        ('Scare Rating', pa.float64()),
+        ('extra', pa.string())
+    ]),
+    'edges': pa.schema([
+        ('movie', pa.string()),
+        ('object', pa.string()),
+        ('connection', pa.string())
+    ]),
+    'scares': pa.schema([
+        ('movie', pa.string()),
+        ('timestamp', pa.string()),
+        ('seconds', pa.float64()),
+        ('desc', pa.string()),
+        ('major', pa.bool_())
+    ])
+}
+MOVIE_COLUMNS = SCHEMAS['movies'].names
+
+
+def get_table_path(name, path=STORE_DIR):
+    table_path = os.path.join(path, name + '.parquet')
+    return table_path
+
+
+def get_store_paths(path=STORE_DIR):
+    store_paths = [get_table_path(name, path) for name in SCHEMAS]
+    return store_paths
+
+
+def store_exists(path=STORE_DIR):
+    return all(os.path.exists(table_path) for table_path in get_store_paths(path))
+
+
+def open_store_writers(path=STORE_DIR):
+    os.makedirs(path, exist_ok=True)
+    writers = {name: pq.ParquetWriter(get_table_path(name, path) + '.tmp', schema) for name, schema in SCHEMAS.items()}
+    return writers
+
+
+def append_to_store(writers, tables):
+    for name, table in tables.items():
+        schema = SCHEMAS[name]
+        writers[name].write_table(pa.Table.from_pandas(table[schema.names], schema=schema, preserve_index=False))
+
+
+def close_store_writers(writers, path=STORE_DIR):
+    for name, writer in writers.items():
+        writer.close()
+        os.replace(get_table_path(name, path) + '.tmp', get_table_path(name, path))
+
+
+def write_store(batches, path=STORE_DIR):
+    writers = open_store_writers(path)
+    for tables in batches:
+        append_to_store(writers, tables)
+    close_store_writers(writers, path)
+
+
+def load_table(name, columns=None, path=STORE_DIR):
+    table = pd.read_parquet(get_table_path(name, path), columns=columns)
+    return table
+
+
+def load_movies(columns=None):
+    return load_table('movies', columns)
+
+
+def load_edges(columns=None):
+    return load_table('edges', columns)
+
+
+def load_scares(columns=None):
+    return load_table('scares', columns)
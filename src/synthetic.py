@@ -0,0 +1,78 @@
+import numpy as np
+
+
+# shaped after the scraped catalog: release years grow roughly exponentially towards the present,
+# a director's movies tend to share a tag, and about 1% of the movies have no director listed
+YEARS = np.arange(1940, 2020)
+YEAR_SCALE = 12
+NO_DIRECTOR_RATE = 0.013
+FAVORITE_TAG_RATE = 0.5
+
+
+def get_synthetic_details(n_movies=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    tags = get_zipf_pool('Tag', max(20, n_movies // 25), rng)
+    directors = get_zipf_pool('Director', max(10, int(n_movies * 0.7)), rng)
+    favorite_tags = dict(zip(directors[0], rng.choice(tags[0], len(directors[0]), p=tags[1])))
+    years = rng.choice(YEARS, n_movies, p=get_year_weights())
+    data_details = {f'Movie {i} ({years[i]})': get_synthetic_movie(i, tags, directors, favorite_tags, rng) for i in range(n_movies)}
+    return data_details
+
+
+def get_year_weights():
+    weights = np.exp((YEARS - YEARS[-1]) / YEAR_SCALE)
+    return weights / weights.sum()
+
+
+def get_zipf_pool(prefix, size, rng, exponent=1.1):
+    names = np.array([f'{prefix} {i}' for i in range(size)])
+    weights = 1 / np.arange(1, size + 1) ** exponent
+    return names, weights / weights.sum()
+
+
+def get_synthetic_movie(i, tags, directors, favorite_tags, rng):
+    runtime = rng.randint(75, 140)
+    major = rng.poisson(1.5)
+    minor = rng.poisson(8)
+    movie = {
+        'link': f'https://wheresthejump.com/jump-scares-in-movie-{i}/',
+        'scare': get_synthetic_scares(major, minor, runtime, rng),
+        'Synopsis': f'Synthetic movie number {i}.',
+        'Runtime': f'{runtime} minutes',
+        'MPAA Rating': str(rng.choice(['R', 'PG-13', 'PG', 'Not Rated'])),
+        'imdb': f'{np.clip(rng.normal(6, 1), 1, 10):.1f}/10',
+        'tomato': 'N/A' if rng.rand() < 0.05 else f'{rng.randint(0, 101)}%',
+        'Netflix (US)': str(rng.choice(['Yes', 'No'])),
+        'Jump Scares': f'{major + minor} ({major} major, {minor} minor)',
+        'Jump Scare Rating': 'Synthetic jump scare rating.',
+        'Scare Rating': float(rng.randint(0, 11) / 2)
+    }
+    n_directors = 0 if rng.rand() < NO_DIRECTOR_RATE else 1 + rng.binomial(2, 0.02)
+    movie_directors = [str(director) for director in rng.choice(directors[0], n_directors, replace=False, p=directors[1])]
+    if n_directors > 1:
+        movie['Directors'] = ', '.join(movie_directors)
+    elif n_directors == 1:
+        movie['Director'] = movie_directors[0]
+    if rng.rand() < 0.4:
+        n_tags = min(1 + rng.poisson(3), len(tags[0]))
+        movie_tags = [str(tag) for tag in rng.choice(tags[0], n_tags, replace=False, p=tags[1])]
+        if movie_directors and rng.rand() < FAVORITE_TAG_RATE:
+            favorite_tag = str(favorite_tags[movie_directors[0]])
+            movie_tags = [favorite_tag] + [tag for tag in movie_tags if tag != favorite_tag][:n_tags - 1]
+        movie['Tags'] = movie_tags
+    return movie
+
+
+def get_synthetic_scares(major, minor, runtime, rng):
+    seconds = np.sort(rng.randint(0, runtime * 60, major + minor))
+    is_major = rng.permutation([True] * major + [False] * minor)
+    scares = {format_timestamp(second): {'desc': 'Something jumps out.', 'major': bool(flag)} for second, flag in zip(seconds, is_major)}
+    return scares
+
+
+def format_timestamp(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
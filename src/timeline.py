@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+TIMELINE_FIELDS = ['First Scare', 'Mean Scare Gap', 'Min Scare Gap', 'Scariest Minute', 'Scariest Minute Scares']
+
+
+def get_timeline(scares, movies):
+    # all scare times in seconds as one flat array sorted by movie, with the scares of movie i
+    # at seconds[offsets[i]:offsets[i + 1]]
+    movies = list(movies)
+    movie_ids = pd.Categorical(scares['movie'], categories=movies).codes.astype(np.int64)
+    seconds = scares['seconds'].values.astype(np.float64)
+    valid = (movie_ids >= 0) & ~np.isnan(seconds)
+    movie_ids, seconds = movie_ids[valid], seconds[valid]
+    order = np.lexsort((seconds, movie_ids))
+    timeline = {
+        'movies': movies,
+        'movie_ids': {movie: i for i, movie in enumerate(movies)},
+        'seconds': seconds[order],
+        'offsets': np.searchsorted(movie_ids[order], np.arange(len(movies) + 1))
+    }
+    return timeline
+
+
+def get_scare_movie_ids(timeline):
+    return np.repeat(np.arange(len(timeline['movies'])), np.diff(timeline['offsets']))
+
+
+def get_density(timeline, bin_seconds=60):
+    movie_ids = get_scare_movie_ids(timeline)
+    bins = (timeline['seconds'] // bin_seconds).astype(np.int64)
+    n_bins = bins.max() + 1 if len(bins) else 1
+    keys, counts = np.unique(movie_ids * n_bins + bins, return_counts=True)
+    return keys // n_bins, keys % n_bins, counts
+
+
+def get_histogram(timeline, movies, bin_seconds=600):
+    offsets = timeline['offsets']
+    movie_ids = [timeline['movie_ids'][movie] for movie in movies if movie in timeline['movie_ids']]
+    seconds = np.concatenate([timeline['seconds'][offsets[i]:offsets[i + 1]] for i in movie_ids] + [np.empty(0)])
+    histogram = np.bincount((seconds // bin_seconds).astype(np.int64))
+    return histogram
+
+
+def get_timeline_stats(timeline):
+    n_movies = len(timeline['movies'])
+    seconds, offsets = timeline['seconds'], timeline['offsets']
+    movie_ids = get_scare_movie_ids(timeline)
+    has_scares = np.diff(offsets) > 0
+    first_scare = np.full(n_movies, np.nan)
+    first_scare[has_scares] = seconds[offsets[:-1][has_scares]] / 60
+
+    same_movie = movie_ids[1:] == movie_ids[:-1]
+    gaps = np.diff(seconds)[same_movie] / 60
+    gap_ids = movie_ids[1:][same_movie]
+    gap_counts = np.bincount(gap_ids, minlength=n_movies)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_gap = np.bincount(gap_ids, weights=gaps, minlength=n_movies) / gap_counts
+    min_gap = np.full(n_movies, np.inf)
+    np.minimum.at(min_gap, gap_ids, gaps)
+    min_gap[gap_counts == 0] = np.nan
+
+    bin_movies, bins, bin_counts = get_density(timeline)
+    order = np.lexsort((bins, -bin_counts, bin_movies))
+    top_rows = order[np.unique(bin_movies[order], return_index=True)[1]]
+    scariest_minute = np.full(n_movies, np.nan)
+    scariest_minute[bin_movies[top_rows]] = bins[top_rows]
+    scariest_count = np.full(n_movies, np.nan)
+    scariest_count[bin_movies[top_rows]] = bin_counts[top_rows]
+
+    timeline_stats = pd.DataFrame(dict(zip(TIMELINE_FIELDS, [first_scare, mean_gap, min_gap, scariest_minute, scariest_count])), index=timeline['movies'])
+    return timeline_stats
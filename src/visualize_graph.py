@@ -2,10 +2,10 @@ import numpy as np
 import pandas as pd
 import plotly.offline as plt
 import plotly.graph_objs as go
-import networkx as nx
-from tqdm import tqdm
-import functools
-tqdm.pandas()
+from src.graph import get_neighborhood, get_induced_edges
+from src.layout import get_layout, get_layout_method
+from src.metrics import timed
+from src.query import get_query_mask
 
 mck_palette = ['#FAA082', '#AFC3FF', '#E5546C', '#034B6F', '#8C5AC8', '#E6A0C8', '#027AB1', '#39BDF3', '#71D2F1', '#3C96B4', '#AAE6F0']
 
@@ -15,122 +15,294 @@ mck_palette_mapping = {
     "tag": mck_palette[3]
 }
 
+# level of detail: above LOD_EDGE_LIMIT edges the dashboard renders with WebGL, and when more than
+# LOD_NODE_LIMIT nodes are in view only the best connected ones are drawn while the rest are
+# clustered and their edges bundled on a LOD_GRID x LOD_GRID grid over the viewport
+LOD_EDGE_LIMIT = 5000
+LOD_NODE_LIMIT = 3000
+LOD_GRID = 48
+LOD_MAX_BUNDLES = 2000
 
-def plot_G(G, dims=None, node=None, auto_open=True):
-    df_pos = get_positions(G, dims)
-    node_trace, selected_few = get_node_trace(G, df_pos, dims, node)
+
+def plot_G(G, dims=None, node=None, auto_open=True, query=None):
+    positions = get_positions(G, dims, query)
+    node_trace, selected_few = get_node_trace(G, positions, dims, node)
     if node:
-        G_sub = G.subgraph(selected_few)
-        edge_trace = get_edge_trace(G_sub, df_pos, width=0.9)
+        edge_trace = get_edge_trace(G, positions, width=0.9, edges=get_induced_edges(G, selected_few))
     else:
-        edge_trace = get_edge_trace(G, df_pos)
+        edge_trace = get_edge_trace(G, positions)
     fig = get_figure(edge_trace, node_trace)
     if auto_open:
         plt.plot(fig, auto_open=True)
     return fig
 
 
-def get_positions(G, dims):
+@timed('get_positions')
+def get_positions(G, dims, query=None):
+    table = G.graph['table']
     if dims and len(dims) == 4:
-        pos = [[node, data[dims[2]], data[dims[3]]] for node, data in G.nodes(data=True) if dims[2] in data.keys() and dims[3] in data.keys()]
-        df_pos = pd.DataFrame(pos, columns=['index', 'x', 'y'])
+        positions = np.stack([get_column_values(table, dims[2]), get_column_values(table, dims[3])], axis=1)
     elif dims and len(dims) == 3:
-        pos = [[node, G.node[node][dims[2]]] for node, neighbors in G.adj.items()]
-        df_pos = pd.DataFrame(pos).reset_index()
-        df_pos.columns = ['y', 'index','x']
-        df_pos = df_pos[['index','x','y']]
-        # pos = [[node, G.node[nodyye][dims[2]], np.std([G.node[neighbor][dims[2]] for neighbor in neighbors])] for node, neighbors in G.adj.items()]
-        # df_pos = pd.DataFrame(pos, columns=['index', 'x','y'])
+        positions = np.stack([get_column_values(table, dims[2]), np.arange(len(table), dtype=np.float64)], axis=1)
+    else:
+        positions = get_algo_positions(G)
+    mask = get_query_mask(G, query)
+    if mask is not None:
+        # nodes outside the query are unplaced, which drops them and their edges from every trace
+        positions = np.where(mask[:, None], positions, np.nan)
+    return positions
+
+
+def get_column_values(table, field):
+    column = table[field]
+    if pd.api.types.is_categorical_dtype(column):
+        values = column.cat.codes.values.astype(np.float64)
     else:
-        df_pos = get_algo_positions(G)
-    return df_pos
+        values = column.values
+    return values
 
 
-@functools.lru_cache()
-def get_algo_positions(G):
+def get_algo_positions(G, method=None):
     # pos=nx.kamada_kawai_layout(G) # IS KAWAII
     # pos = nx.shell_layout(G) # IS A CIRCLE
     # pos = nx.spring_layout(G, k=0.3, seed=2)  # THIS ONE LOOKS PROMISING
-    pos = nx.spring_layout(G, k=0.07, seed=2)  # THIS ONE LOOKS PROMISING
     # pos = nx.spring_layout(G, 3) # THIS ONE LOOKS PROMISING
     # pos = nx.spectral_layout(G) # LOL WAT IS DIS
-    df_pos = pd.DataFrame(pos, index=['x', 'y']).T.reset_index()
-    return df_pos
+    # kept on the graph, so the positions are freed together with a graph version that is dropped
+    method = method or get_layout_method(G)
+    positions = G.graph.setdefault('positions', {})
+    if method not in positions:
+        positions[method] = get_layout(G, method)
+    return positions[method]
 
 
-def get_node_trace(G, df_pos, dims, node=None):
-    max_size = 40
-    default_size = 20
+@timed('get_node_trace')
+def get_node_trace(G, positions, dims, node=None):
     node_trace = go.Scatter(
         x=[],
         y=[],
         text=[],
         mode='markers',
         hoverinfo='text',
-        marker=dict(
-            showscale=True,
-            opacity=0.8,
-            colorscale='YlGnBu',
-            reversescale=True,
-            color='white',
-            size=20,
-            colorbar=dict(
-                thickness=15,
-                # title='Has shared any file in March 2019',
-                xanchor='left',
-                titleside='right'
-            ),
-            line=dict(width=2)))
-    df_nodes = pd.DataFrame(G.nodes(data=True), columns=['n', 'data'])
-    df_nodes = df_nodes.merge(df_pos, left_on='n', right_on='index')
-    # df_nodes = df_nodes.merge(tb.fillna(0), how='left', left_on='n', right_on='fmno')
-    node_trace['x'] = df_nodes['x'].to_list()
-    node_trace['y'] = df_nodes['y'].to_list()
-    node_trace['text'] = df_nodes['n'].to_list()
-    if dims:
-        if len(dims) >=1:
-            df_nodes[dims[0]] = df_nodes['data'].apply(lambda x: x[dims[0]])
-            if np.issubdtype(df_nodes[dims[0]].dtype, np.number):  # is numeric
-                df_nodes['norm_size'] = normalize(df_nodes[dims[0]])
-                df_nodes['bubble_size'] = df_nodes['norm_size'].apply(lambda x: get_bubble_size(x, max_size, default_size))
-            else:
-                df_nodes['norm_size'] = normalize_categorical(df_nodes[dims[0]])
-                df_nodes['bubble_size'] = df_nodes['norm_size'].apply(lambda x: get_bubble_size(x, max_size, default_size))
-            node_trace['marker']['size'] = df_nodes['bubble_size'].to_list()
-
-        if len(dims) >=2:
-            df_nodes[dims[1]] = df_nodes['data'].apply(lambda x: x[dims[1]])
-            if np.issubdtype(df_nodes[dims[1]].dtype, np.number):  # is numeric
-                df_nodes['color'] = normalize(df_nodes[dims[1]])
-                # df_nodes['color'] = df_nodes[dims[1]]
-            else:
-                df_nodes['color'] = df_nodes[dims[1]].astype('category').cat.codes.apply(lambda x: mck_palette[x % 11])
-            node_trace['marker']['color'] = df_nodes['color'].to_list()
+        marker=get_marker_style())
+    shown = get_shown_nodes(positions)
+    node_trace['x'] = positions[shown, 0]
+    node_trace['y'] = positions[shown, 1]
+    node_trace['text'] = [G.graph['nodes'][node_id] for node_id in shown]
+    marker_values = get_marker_values(G.graph['table'], dims)
+    node_trace['marker'].update({key: np.asarray(values)[shown] for key, values in marker_values.items()})
 
     # images = df_nodes[df_nodes.is_instance == 'movie'].apply(lambda x: create_image_layout(x.img_url, x.x, x.y, x.bubble_size), axis=1).to_list()
     if node:
-        node_type = G.node[node]['is_instance']
-        neighbors = list(nx.neighbors(G, node))
-        extra_neighbors = [list(nx.neighbors(G, node)) for node in neighbors]
-        filtered_extra = [n for ns in extra_neighbors for n in ns if G.node[n]['is_instance'] != node_type]
-        selected_few = neighbors + filtered_extra + [node]
-        node_trace['marker']['opacity'] = df_nodes.n.apply(lambda x: (x in selected_few) * 0.7 + 0.1).to_list()
+        selected_few = get_neighborhood(G, node)
+        selected = np.zeros(len(G), dtype=bool)
+        selected[selected_few] = True
+        node_trace['marker']['opacity'] = selected[shown] * 0.7 + 0.1
     else:
         selected_few = None
     return node_trace, selected_few
 
 
-def normalize(x):
-    normalized = (x - min(x))/(max(x) - min(x))
-    return normalized
+def get_shown_nodes(positions):
+    shown = np.flatnonzero(~np.isnan(positions).any(axis=1))
+    return shown
 
 
-def get_bubble_size(x, max_size, default_size, power_skew=3):
-    if not np.isnan(x):
-        bubble_size = x**power_skew * max_size
+def get_marker_style():
+    marker_style = dict(
+        showscale=True,
+        opacity=0.8,
+        colorscale='YlGnBu',
+        reversescale=True,
+        color='white',
+        size=20,
+        colorbar=dict(
+            thickness=15,
+            # title='Has shared any file in March 2019',
+            xanchor='left',
+            titleside='right'
+        ),
+        line=dict(width=2))
+    return marker_style
+
+
+def get_marker_values(table, dims):
+    marker_values = {}
+    if dims and len(dims) >= 1 and dims[0]:
+        marker_values['size'] = get_bubble_sizes(table[dims[0]]).values
+    if dims and len(dims) >= 2 and dims[1]:
+        marker_values['color'] = get_colors(table[dims[1]]).values
+    return marker_values
+
+
+def get_bubble_sizes(values, max_size=40, default_size=20, power_skew=3):
+    if pd.api.types.is_numeric_dtype(values):  # is numeric
+        norm_size = normalize(values)
     else:
-        bubble_size = default_size
-    return bubble_size
+        norm_size = normalize_categorical(values)
+    bubble_sizes = pd.Series(np.where(np.isnan(norm_size), default_size, norm_size ** power_skew * max_size))
+    return bubble_sizes
+
+
+def get_colors(values):
+    if pd.api.types.is_numeric_dtype(values):  # is numeric
+        colors = normalize(values)
+    else:
+        colors = values.astype('category').cat.codes.apply(lambda x: mck_palette[x % 11])
+    return colors
+
+
+@timed('get_geometry')
+def get_geometry(G, dims, viewport=None, lod=False, query=None):
+    positions = get_positions(G, dims, query)
+    if lod:
+        return get_lod_geometry(G, positions, viewport)
+    edge_x, edge_y, drawn = get_edge_coordinates(positions, G.graph['edges'])
+    shown = get_shown_nodes(positions)
+    geometry = {
+        'nodes': shown,
+        'x': positions[shown, 0],
+        'y': positions[shown, 1],
+        'edge_x': edge_x,
+        'edge_y': edge_y,
+        'edge_connections': get_connection_codes(G, G.graph['edges'][drawn]),
+        'webgl': False
+    }
+    return geometry
+
+
+def use_lod(G, render):
+    return render == 'webgl' or (render == 'auto' and len(G.graph['edges']) > LOD_EDGE_LIMIT)
+
+
+def get_viewport(relayout_data):
+    keys = ['xaxis.range[0]', 'xaxis.range[1]', 'yaxis.range[0]', 'yaxis.range[1]']
+    if not relayout_data or not any(key in relayout_data for key in keys):
+        return None
+    viewport = tuple(round(float(relayout_data[key]), 3) if key in relayout_data else None for key in keys)
+    return viewport
+
+
+def get_lod_geometry(G, positions, viewport=None):
+    shown = get_shown_nodes(positions)
+    bounds = [positions[shown, 0].min(), positions[shown, 0].max(), positions[shown, 1].min(), positions[shown, 1].max()] if len(shown) else [0, 1, 0, 1]
+    x0, x1, y0, y1 = [bound if value is None else value for value, bound in zip(viewport or [None] * 4, bounds)]
+    x0, x1, y0, y1 = min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1)
+    x, y = positions[shown, 0], positions[shown, 1]
+    in_view = shown[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
+    visible = np.zeros(len(positions), dtype=bool)
+    visible[in_view] = True
+    edges = G.graph['edges']
+    geometry = {'webgl': True}
+    if len(in_view) <= LOD_NODE_LIMIT:
+        detailed = in_view
+        visible_edges = edges[visible[edges[:, 0]] | visible[edges[:, 1]]]
+        edge_x, edge_y, drawn = get_edge_coordinates(positions, visible_edges)
+        # bundled edges below carry no connection, so they have no hover text
+        geometry['edge_connections'] = get_connection_codes(G, visible_edges[drawn])
+    else:
+        degrees = np.diff(G.graph['indptr'])
+        detailed = np.sort(in_view[np.argsort(-degrees[in_view], kind='stable')[:LOD_NODE_LIMIT // 2]])
+        cell_size = max(x1 - x0, y1 - y0, 1e-9) / LOD_GRID
+        cells = np.full(len(positions), -1, dtype=np.int64)
+        cell_xy = np.minimum(((positions[in_view] - [x0, y0]) / cell_size).astype(np.int64), LOD_GRID - 1)
+        cells[in_view] = cell_xy[:, 0] * LOD_GRID + cell_xy[:, 1]
+        centroids = get_cell_centroids(positions, in_view, cells[in_view])
+        clustered = in_view[~np.isin(in_view, detailed)]
+        cluster_counts = np.bincount(cells[clustered], minlength=LOD_GRID ** 2)
+        cluster_cells = np.flatnonzero(cluster_counts)
+        geometry['clusters'] = {
+            'x': centroids[cluster_cells, 0],
+            'y': centroids[cluster_cells, 1],
+            'size': np.clip(4 + 4 * np.log2(cluster_counts[cluster_cells]), 4, 40),
+            'text': [f'{count} nodes' for count in cluster_counts[cluster_cells]]
+        }
+        edge_x, edge_y = get_bundled_edges(edges, cells, centroids)
+    geometry.update({
+        'nodes': detailed,
+        'x': positions[detailed, 0],
+        'y': positions[detailed, 1],
+        'edge_x': edge_x,
+        'edge_y': edge_y
+    })
+    return geometry
+
+
+def get_cell_centroids(positions, node_ids, node_cells):
+    counts = np.bincount(node_cells, minlength=LOD_GRID ** 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroids = np.stack([np.bincount(node_cells, weights=positions[node_ids, i], minlength=LOD_GRID ** 2) / counts for i in range(2)], axis=1)
+    return centroids
+
+
+def get_bundled_edges(edges, cells, centroids):
+    a, b = cells[edges[:, 0]], cells[edges[:, 1]]
+    bundled = (a >= 0) & (b >= 0) & (a != b)
+    pairs = np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)[bundled]
+    if not len(pairs):
+        return np.empty(0), np.empty(0)
+    pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+    pairs = pairs[np.argsort(-counts, kind='stable')[:LOD_MAX_BUNDLES]]
+    edge_x, edge_y, _ = get_edge_coordinates(centroids, pairs)
+    return edge_x, edge_y
+
+
+@timed('get_marker')
+def get_marker(G, dims):
+    marker = get_marker_values(G.graph['table'], dims)
+    return marker
+
+
+@timed('get_selection')
+def get_selection(G, node):
+    if not node:
+        return None
+    selected_few = get_neighborhood(G, node)
+    edges = get_induced_edges(G, selected_few)
+    selection = {
+        'nodes': selected_few,
+        'edges': edges,
+        'connections': get_connection_codes(G, edges)
+    }
+    return selection
+
+
+def get_connection_codes(G, edges):
+    # the codes index the connection labels sent once with the figure base
+    node_connections = get_node_connections(G)[1]
+    connection_codes = np.maximum(node_connections[edges[:, 0]], node_connections[edges[:, 1]])
+    return connection_codes
+
+
+def get_node_connections(G):
+    # every edge links a movie to a director or a tag, so its connection is the one of its
+    # non-movie end, and movies get -1
+    if 'node_connections' not in G.graph:
+        labels, codes = np.unique(G.graph['edge_connections'], return_inverse=True)
+        is_movie = (G.graph['table']['is_instance'] == 'movie').values
+        edges = G.graph['edges']
+        node_connections = np.full(len(is_movie), -1, dtype=np.int32)
+        node_connections[np.where(is_movie[edges[:, 0]], edges[:, 1], edges[:, 0])] = codes
+        G.graph['node_connections'] = (list(labels), node_connections)
+    return G.graph['node_connections']
+
+
+def get_figure_base(G):
+    layout = get_figure_layout().to_plotly_json()
+    layout['uirevision'] = True
+    figure_base = {
+        'version': G.graph['version'],
+        'labels': G.graph['nodes'],
+        'connection_labels': get_node_connections(G)[0],
+        'marker': get_marker_style(),
+        'layout': layout
+    }
+    return figure_base
+
+
+def normalize(x):
+    normalized = (x - x.min())/(x.max() - x.min())
+    return normalized
 
 
 def normalize_categorical(x):
@@ -139,44 +311,59 @@ def normalize_categorical(x):
     return normalized_codes
 
 
-def get_edge_trace(G, df_pos, width=0.5, color = '#cccccc'):
+@timed('get_edge_trace')
+def get_edge_trace(G, positions, width=0.5, color = '#cccccc', edges=None):
     edge_trace = go.Scatter(
         x=[],
         y=[],
         line=dict(width=width, color=color),
         hoverinfo='text',
         mode='lines')
-    df_edges = pd.DataFrame(G.edges(data=True), columns=['a', 'b', 'connection'])
-    df_edges['connection'] = df_edges['connection'].apply(lambda x: x['connection'])
-    df_edges = df_edges.merge(df_pos, left_on='a', right_on='index', suffixes=('o', 'a')).merge(df_pos, left_on='b', right_on='index', suffixes=('a', 'b'))
-    x = df_edges.apply(lambda o: tuple([o.xa, o.xb, None]), axis=1)
-    x = [single_x for tuple_x in x for single_x in tuple_x]
-    y = df_edges.apply(lambda o: tuple([o.ya, o.yb, None]), axis=1)
-    y = [single_y for tuple_y in y for single_y in tuple_y]
+    if edges is None:
+        edges, connections = G.graph['edges'], G.graph['edge_connections']
+    else:
+        connections = np.array([G.edges[G.graph['nodes'][a], G.graph['nodes'][b]]['connection'] for a, b in edges])
+    x, y, drawn = get_edge_coordinates(positions, edges)
     edge_trace['x'] = x
     edge_trace['y'] = y
-    edge_trace['text'] = list(df_edges['connection'])
+    # plotly labels the points of a line, so each edge's label is repeated for its ends and gap
+    edge_trace['text'] = np.repeat(connections[drawn], 3)
     return edge_trace
 
 
+def get_edge_coordinates(positions, edges):
+    endpoints = positions[edges]
+    drawn = ~np.isnan(endpoints).any(axis=(1, 2))
+    coordinates = np.full((drawn.sum(), 3, 2), np.nan)
+    coordinates[:, :2] = endpoints[drawn]
+    x = coordinates[:, :, 0].ravel()
+    y = coordinates[:, :, 1].ravel()
+    return x, y, drawn
+
+
+@timed('get_figure')
 def get_figure(edge_trace, node_trace):
-    fig = go.Figure(data=[edge_trace, node_trace],
-                    layout=go.Layout(
-                        # title=f'<br>{target} {practice_function}',
-                        paper_bgcolor='rgb(5, 28, 44)',  # mck dark blue
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        titlefont=dict(size=16),
-                        showlegend=False,
-                        hovermode='closest',
-                        transition ={
-                            'duration': 500,
-                            'easing': 'cubic-in-out'
-                        },
-                        margin=dict(b=20, l=5, r=5, t=40),
-                        xaxis=dict(showgrid=False, zeroline=False, showticklabels=True),
-                        yaxis=dict(showgrid=False, zeroline=False, showticklabels=True)))
+    fig = go.Figure(data=[edge_trace, node_trace], layout=get_figure_layout())
     return fig
 
 
+def get_figure_layout():
+    layout = go.Layout(
+        # title=f'<br>{target} {practice_function}',
+        paper_bgcolor='rgb(5, 28, 44)',  # mck dark blue
+        plot_bgcolor='rgba(0,0,0,0)',
+        titlefont=dict(size=16),
+        showlegend=False,
+        hovermode='closest',
+        transition ={
+            'duration': 500,
+            'easing': 'cubic-in-out'
+        },
+        margin=dict(b=20, l=5, r=5, t=40),
+        xaxis=dict(showgrid=False, zeroline=False, showticklabels=True),
+        yaxis=dict(showgrid=False, zeroline=False, showticklabels=True))
+    return layout
+
+
 # plot_G(H, dims = ['imdb', 'is_instance'])
 # plot_G(H, dims=['imdb', 'is_instance', 'is_instance', 'imdb'], node='Survival')
@@ -0,0 +1,36 @@
+import functools
+import http.server
+import os
+import shutil
+import threading
+import pytest
+from src.graph import build_graph
+from src.synthetic import get_synthetic_details
+
+SITE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'site')
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    # the saved pages in tests/data/site served by a local http.server, standing in for the live
+    # site, with the scraper's data directory under tmp_path
+    root = str(tmp_path / 'site')
+    shutil.copytree(SITE_DIR, root)
+    os.makedirs(str(tmp_path / 'data'))
+    monkeypatch.chdir(tmp_path)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield {'url': f'http://127.0.0.1:{server.server_port}', 'root': root}
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def G():
+    # a small synthetic catalog built the way build_graph builds the scraped one
+    return build_graph(get_synthetic_details(300), 'synthetic')
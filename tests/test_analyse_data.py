@@ -0,0 +1,98 @@
+import json
+import os
+import statistics
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from src import analyse_data
+from src.synthetic import get_synthetic_details
+
+
+@pytest.fixture
+def records(tmp_path, monkeypatch):
+    # a synthetic catalog written the way the scraper leaves it, and the same movies as plain records
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analyse_data, 'analytics_cache', {})
+    os.makedirs('data')
+    data_details = get_synthetic_details(200)
+    json.dump(data_details, open('data/data_details.json', 'w'))
+    records = [{
+        'Movie Name': movie,
+        'Director': details.get('Director'),
+        'Year': int(movie[-5:-1]),
+        'Jump Count': int(details['Jump Scares'].split()[0]),
+        'Jump Scare Rating': details['Scare Rating'],
+        'Netflix (US)': details['Netflix (US)'],
+        'Imdb': float(details['imdb'].split('/')[0]),
+        'link': details['link'],
+        'tomato': float(details['tomato'].rstrip('%')) / 100 if details['tomato'] != 'N/A' else np.nan,
+        'Runtime': float(details['Runtime'].split()[0])
+    } for movie, details in data_details.items()]
+    write_jumpscares(records)
+    return records
+
+
+def write_jumpscares(records):
+    pd.DataFrame(records).drop(columns=['tomato', 'Runtime']).to_csv(analyse_data.JUMPSCARES_PATH)
+
+
+def get_values(records, measure, **conditions):
+    values = [record[measure] for record in records if all(record[key] == value for key, value in conditions.items())]
+    return [value for value in values if not np.isnan(value)]
+
+
+def test_year_means_and_netflix_effect(records):
+    analytics = analyse_data.get_analytics()
+    years = analytics['year'].set_index('Year')
+    for year in sorted({record['Year'] for record in records}):
+        assert years.loc[year, 'movies'] == len([record for record in records if record['Year'] == year])
+        for measure in analyse_data.MEASURES:
+            np.testing.assert_allclose(years.loc[year, f'{measure} mean'], statistics.mean(get_values(records, measure, Year=year)))
+
+    effect = analytics['netflix_effect'].set_index('measure')
+    for measure in analyse_data.MEASURES:
+        on, off = get_values(records, measure, **{'Netflix (US)': 'Yes'}), get_values(records, measure, **{'Netflix (US)': 'No'})
+        welch_t = (statistics.mean(on) - statistics.mean(off)) / np.sqrt(statistics.variance(on) / len(on) + statistics.variance(off) / len(off))
+        np.testing.assert_allclose(effect.loc[measure, 'welch t'], welch_t)
+
+
+def test_robust_z_outliers(records):
+    movies = analyse_data.get_analytics()['movies']
+    threshold = 2
+    expected = {}
+    for measure in analyse_data.MEASURES:
+        median = statistics.median(get_values(records, measure))
+        mad = statistics.median([abs(value - median) for value in get_values(records, measure)])
+        for record in records:
+            score = 0.6745 * (record[measure] - median) / mad if mad else np.nan
+            if abs(score) > threshold:
+                expected[(record['Movie Name'], measure)] = score
+    outliers = analyse_data.get_outliers(movies, threshold)
+    assert expected
+    assert set(zip(outliers['movie'], outliers['measure'])) == set(expected)
+    np.testing.assert_allclose(outliers['score'], [expected[key] for key in zip(outliers['movie'], outliers['measure'])])
+    assert list(outliers['score'].abs()) == sorted(outliers['score'].abs(), reverse=True)
+
+
+def test_analytics_cache_follows_the_data(records, monkeypatch):
+    builds = []
+    build_analytics = analyse_data.build_analytics
+    monkeypatch.setattr(analyse_data, 'build_analytics', lambda: builds.append(1) or build_analytics())
+    first = analyse_data.get_analytics()
+    assert analyse_data.get_analytics() is first
+    assert len(builds) == 1
+
+    # a touched file is hashed again, and the same data is read back from data/analytics
+    os.utime(analyse_data.JUMPSCARES_PATH, (time.time() + 10, time.time() + 10))
+    touched = analyse_data.get_analytics()
+    assert touched is not first and len(builds) == 1
+    assert touched['year'].equals(first['year'])
+
+    records[0]['Imdb'] = 9.9
+    write_jumpscares(records)
+    os.utime(analyse_data.JUMPSCARES_PATH, (time.time() + 20, time.time() + 20))
+    changed = analyse_data.get_analytics()
+    assert len(builds) == 2
+    assert not changed['year'].equals(first['year'])
+    assert len(os.listdir(analyse_data.ANALYTICS_DIR)) == 2
@@ -0,0 +1,11 @@
+import pytest
+from dash.exceptions import PreventUpdate
+from app import get_page_G
+
+
+def test_evicted_version_is_not_served_another_graph(G, monkeypatch):
+    # get_G falls back to the live graph when the page's version is no longer kept
+    monkeypatch.setattr('app.get_G', lambda version=None: G)
+    assert get_page_G({'version': G.graph['version']}) is G
+    with pytest.raises(PreventUpdate):
+        get_page_G({'version': 'evicted'})
@@ -0,0 +1,8 @@
+import pytest
+from src.benchmark import IMPORT_BUDGETS, check_import
+
+
+@pytest.mark.parametrize('module', list(IMPORT_BUDGETS))
+def test_subcommand_imports_stay_light(module):
+    _, _, problems = check_import(module)
+    assert problems == []
@@ -0,0 +1,36 @@
+import json
+import os
+import pytest
+from src.export import export_views
+from src.graph import build_graph
+from src.synthetic import get_synthetic_details
+
+
+@pytest.fixture
+def small_G(tmp_path, monkeypatch):
+    # the layout is persisted under data/, so the export runs in tmp_path
+    monkeypatch.chdir(tmp_path)
+    G = build_graph(get_synthetic_details(40), 'small')
+    return G
+
+
+def test_export_views_on_a_pool(small_G, tmp_path):
+    director = next(node for node, data in small_G.nodes(data=True) if data['is_instance'] == 'person')
+    specs = [(None, None), (['Runtime', 'is_instance'], None), (['imdb', 'is_instance'], director), (['no such field', 'is_instance'], None)]
+    path = str(tmp_path / 'export')
+    returned = export_views(small_G, specs, workers=2, formats=('html', 'json'), path=path)
+
+    manifest = json.load(open(os.path.join(path, 'manifest.json')))
+    assert manifest == json.loads(json.dumps(returned))
+    assert manifest['version'] == 'small'
+    views = manifest['views']
+    assert [(view['dims'], view['node']) for view in views] == [(None, None), (['Runtime', 'is_instance'], None), (['imdb', 'is_instance'], director), (['no such field', 'is_instance'], None)]
+    for view in views[:3]:
+        assert 'error' not in view
+        assert sorted(view['files']) == ['html', 'json']
+        figure = json.load(open(os.path.join(path, view['files']['json'])))
+        assert figure['data']
+        assert 'plotly.min.js' in open(os.path.join(path, view['files']['html'])).read()
+    # a spec that fails is recorded in the manifest instead of stopping the pool
+    assert 'error' in views[3]
+    assert sorted(os.listdir(path)) == sorted(['manifest.json', 'plotly.min.js'] + [name for view in views for name in view['files'].values()])
@@ -0,0 +1,25 @@
+import os
+from flask import Flask
+from src.figure_cache import WARM_LIMIT, cache, get_cached_marker, get_warm_views, warm_cache
+from src.graph import PLOT_FIELDS
+
+
+def test_warm_views_of_two_versions_fit_the_cache():
+    views = get_warm_views(PLOT_FIELDS)
+    assert len(views) <= WARM_LIMIT
+    assert len(set(views)) == len(views)
+    assert views[0] == ('geometry', None, None)
+    assert {('marker', dim0, dim1) for dim0 in PLOT_FIELDS for dim1 in PLOT_FIELDS} <= set(views)
+    assert cache.config['CACHE_THRESHOLD'] > 2 * WARM_LIMIT
+    assert cache.config['CACHE_DEFAULT_TIMEOUT'] == 0
+
+
+def test_warm_cache_stores_every_view(G, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = Flask(__name__)
+    cache.init_app(server)
+    fields = ['imdb', 'Runtime', 'is_instance']
+    with server.app_context():
+        warm_cache(G, fields)
+        assert len(os.listdir('cache-directory')) >= len(get_warm_views(fields))
+        assert cache.get(f"marker:{G.graph['version']}:{(('Runtime', 'imdb'),)!r}") == get_cached_marker(G, 'Runtime', 'imdb')
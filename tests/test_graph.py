@@ -0,0 +1,41 @@
+import warnings
+import numpy as np
+from src.graph import SCORE_FIELDS, get_induced_edges, get_neighborhood
+from src.graph_store import gather_rows
+from src.timeline import TIMELINE_FIELDS
+
+
+def test_average_scores_match_nanmean(G):
+    fields = SCORE_FIELDS + TIMELINE_FIELDS
+    groups = [node for node, data in G.nodes(data=True) if data['is_instance'] in ['person', 'tag']]
+    assert groups
+    for group in groups:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            expected = [np.round(np.nanmean([G.node[movie][field] for movie in G.adj[group] if field in G.node[movie]]), 2) for field in fields]
+        actual = [G.node[group][field] for field in fields]
+        assert np.allclose(actual, expected, equal_nan=True), group
+
+
+def test_gather_rows_concatenates_neighbors(G):
+    indptr, indices = G.graph['indptr'], G.graph['indices']
+    rows = np.array([5, 0, 17])
+    expected = np.concatenate([indices[indptr[row]:indptr[row + 1]] for row in rows])
+    np.testing.assert_array_equal(gather_rows(indptr, indices, rows), expected)
+
+
+def test_neighborhoods_match_networkx(G):
+    for node in G.graph['nodes'][::7]:
+        node_type = G.node[node]['is_instance']
+        expected = {node} | set(G.adj[node])
+        expected |= {second for neighbor in G.adj[node] for second in G.adj[neighbor] if G.node[second]['is_instance'] != node_type}
+        assert {G.graph['nodes'][node_id] for node_id in get_neighborhood(G, node)} == expected, node
+
+
+def test_induced_edges_match_subgraph(G):
+    node_ids = np.arange(0, len(G), 3)
+    nodes = [G.graph['nodes'][node_id] for node_id in node_ids]
+    expected = {frozenset(edge) for edge in G.subgraph(nodes).edges()}
+    edges = get_induced_edges(G, node_ids)
+    assert {frozenset((G.graph['nodes'][a], G.graph['nodes'][b])) for a, b in edges} == expected
+    assert (edges[:, 0] < edges[:, 1]).all()
@@ -0,0 +1,38 @@
+import networkx as nx
+import numpy as np
+from src.graph_metrics import get_label_communities, get_pagerank, get_sampled_betweenness
+
+
+def get_csr(G):
+    nodes = list(G)
+    node_ids = {node: i for i, node in enumerate(nodes)}
+    indptr = np.concatenate([[0], np.cumsum([len(G.adj[node]) for node in nodes])]).astype(np.int64)
+    indices = np.array([node_ids[neighbor] for node in nodes for neighbor in G.adj[node]], dtype=np.int32)
+    return nodes, indptr, indices
+
+
+def test_betweenness_from_every_source_matches_networkx():
+    G = nx.karate_club_graph()
+    nodes, indptr, indices = get_csr(G)
+    expected = nx.betweenness_centrality(G, normalized=True)
+    betweenness = get_sampled_betweenness(indptr, indices, samples=len(nodes))
+    np.testing.assert_allclose(betweenness, [expected[node] for node in nodes], atol=1e-12)
+
+
+def test_pagerank_matches_networkx():
+    G = nx.karate_club_graph()
+    G.add_node('isolated')
+    nodes, indptr, indices = get_csr(G)
+    expected = nx.pagerank(G, alpha=0.85, tol=1e-10)
+    np.testing.assert_allclose(get_pagerank(indptr, indices), [expected[node] for node in nodes], atol=1e-6)
+
+
+def test_label_propagation_finds_separate_components():
+    G = nx.Graph()
+    G.add_edges_from((f'movie {i}', f'tag {i // 4 * 2 + j}') for i in range(8) for j in range(2))
+    nodes, indptr, indices = get_csr(G)
+    is_movie = np.array([node.startswith('movie') for node in nodes])
+    communities = dict(zip(nodes, get_label_communities(indptr, indices, is_movie)))
+    first = {communities[f'movie {i}'] for i in range(4)} | {communities['tag 0'], communities['tag 1']}
+    second = {communities[f'movie {i}'] for i in range(4, 8)} | {communities['tag 2'], communities['tag 3']}
+    assert len(first) == 1 and len(second) == 1 and first != second
@@ -0,0 +1,20 @@
+import math
+from src.graph_store import load_graph_artifact, read_artifact_version, save_graph_artifact
+
+
+def same_attributes(a, b):
+    nan = lambda value: isinstance(value, float) and math.isnan(value)
+    # integers have to load back as integers, the info panel shows 8.0 for a float 8
+    return a.keys() == b.keys() and all((a[key] == b[key] and isinstance(a[key], int) == isinstance(b[key], int)) or nan(a[key]) and nan(b[key]) for key in a)
+
+
+def test_artifact_roundtrip(G, tmp_path):
+    path = str(tmp_path)
+    save_graph_artifact(G, path)
+    assert read_artifact_version(path) == G.graph['version']
+    loaded = load_graph_artifact(path)
+    assert list(loaded) == list(G)
+    assert all(same_attributes(loaded.node[node], G.node[node]) for node in G)
+    assert {frozenset(edge): data['connection'] for *edge, data in loaded.edges(data=True)} == {frozenset(edge): data['connection'] for *edge, data in G.edges(data=True)}
+    table = G.graph['table']
+    assert loaded.graph['table'].equals(table[list(loaded.graph['table'].columns)])
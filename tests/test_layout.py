@@ -0,0 +1,31 @@
+import os
+import pytest
+from src import layout
+from src.graph import build_graph
+from src.synthetic import get_synthetic_details
+
+
+@pytest.fixture
+def small_G(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return build_graph(get_synthetic_details(30), 'synthetic')
+
+
+def test_auto_layout_switches_to_fast_for_large_graphs(small_G, monkeypatch):
+    assert layout.get_layout_method(small_G) == 'spring'
+    monkeypatch.setattr(layout, 'SPRING_NODE_LIMIT', len(small_G) - 1)
+    assert layout.get_layout_method(small_G) == 'fast'
+    small_G.graph['layout_method'] = 'spring'
+    assert layout.get_layout_method(small_G) == 'spring'
+
+
+def test_computed_layout_is_stored(small_G, monkeypatch):
+    positions = layout.get_layout(small_G, 'fast')
+    assert positions.shape == (len(small_G), 2)
+    assert os.listdir(layout.LAYOUT_DIR) == [os.path.basename(layout.get_layout_path(small_G, 'fast', layout.LAYOUTS['fast']))]
+
+    def fail(*args):
+        raise AssertionError('layout computed twice')
+
+    monkeypatch.setattr(layout, 'compute_layout', fail)
+    assert (layout.get_layout(small_G, 'fast') == positions).all()
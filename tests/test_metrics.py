@@ -0,0 +1,38 @@
+import importlib
+import pytest
+from flask import Flask
+import src.metrics
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    # ENABLED is read at import, so the module is reloaded with metrics on and again without
+    monkeypatch.setenv('DATAVIZ_METRICS', '1')
+    yield importlib.reload(src.metrics)
+    monkeypatch.delenv('DATAVIZ_METRICS')
+    importlib.reload(src.metrics)
+
+
+def test_timed_is_a_no_op_when_disabled():
+    def stage():
+        return 1
+    assert src.metrics.timed('stage')(stage) is stage
+
+
+def test_metrics_text_reports_stages_and_requests(metrics):
+    double = metrics.timed('double')(lambda value: value * 2)
+    assert double(2) == 4
+
+    server = Flask(__name__)
+    metrics.init_app(server)
+    server.add_url_rule('/' + metrics.DASH_UPDATE_PATH, 'update', lambda: str(double(21)), methods=['POST'])
+    client = server.test_client()
+    assert client.post('/' + metrics.DASH_UPDATE_PATH, json={'output': '..marker.data..'}).data == b'42'
+
+    text = client.get('/metrics').data.decode()
+    assert '# TYPE dataviz_stage_seconds histogram' in text
+    assert 'dataviz_stage_seconds_count{stage="double"} 2' in text
+    assert 'dataviz_stage_seconds_bucket{stage="double",le="+Inf"} 2' in text
+    assert 'dataviz_request_seconds_count{output="marker.data"} 1' in text
+    assert 'dataviz_response_bytes_count{output="marker.data"} 1' in text
+    assert 'dataviz_serialize_seconds_count{output="marker.data"} 1' in text
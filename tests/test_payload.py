@@ -0,0 +1,21 @@
+import numpy as np
+from src.payload import decode_array, encode_payload, round_relative
+
+
+def test_arrays_survive_encoding():
+    floats = np.array([0.0, 1.5, np.nan, 123.456789])
+    ints = np.arange(5)
+    payload = encode_payload({'x': floats, 'nodes': ints, 'labels': ['a', 'b'], 'webgl': True, 'parts': (floats, None)})
+    assert payload['labels'] == ['a', 'b'] and payload['webgl'] is True
+    assert (payload['nodes']['dtype'], payload['x']['dtype']) == ('int32', 'float32')
+    np.testing.assert_array_equal(decode_array(payload['nodes']), ints)
+    np.testing.assert_allclose(decode_array(payload['x']), floats, atol=0.01)
+    np.testing.assert_allclose(decode_array(payload['parts'][0]), floats, atol=0.01)
+    assert payload['parts'][1] is None
+
+
+def test_rounding_is_relative_to_the_extent():
+    values = np.array([1000.123456, 1001.987654])
+    np.testing.assert_allclose(round_relative(values), [1000.1235, 1001.9877], atol=1e-9)
+    np.testing.assert_array_equal(round_relative(np.zeros(3)), np.zeros(3))
+    np.testing.assert_array_equal(round_relative(np.array([np.nan])), [np.nan])
@@ -0,0 +1,25 @@
+import os
+import pytest
+from src.benchmark import GRAPH_BUILD_STAGES, PIPELINE_STAGES, run_pipeline
+
+BENCH_MOVIES = int(os.environ.get('DATAVIZ_BENCH_MOVIES', 300))
+
+
+class PipelineDone(Exception):
+    pass
+
+
+@pytest.mark.parametrize('stage', PIPELINE_STAGES)
+def test_pipeline_stage(stage, benchmark, tmp_path):
+    # the stages before this one only prepare its input, the pipeline stops once it is timed
+    def run(name, func, *args):
+        if name != stage:
+            return func(*args)
+        if name in GRAPH_BUILD_STAGES:
+            benchmark.pedantic(func, args, rounds=1, iterations=1)
+        else:
+            benchmark(func, *args)
+        raise PipelineDone
+
+    with pytest.raises(PipelineDone):
+        run_pipeline(BENCH_MOVIES, 'fast', str(tmp_path), run)
@@ -0,0 +1,35 @@
+import numpy as np
+from src.query import get_query, get_query_mask, get_year_bounds
+
+
+def get_kept_movies(G, query):
+    table = G.graph['table']
+    mask = get_query_mask(G, query)
+    movies = table['is_instance'].values == 'movie'
+    kept = set(np.asarray(G.graph['nodes'])[movies if mask is None else movies & mask])
+    return kept
+
+
+def test_default_controls_keep_every_movie(G):
+    query = get_query(G, list(get_year_bounds(G)), None, None, 0, 0, 0, 'any')
+    assert query is None
+    assert len(get_kept_movies(G, query)) == (G.graph['table']['is_instance'] == 'movie').sum()
+
+
+def test_controls_are_on_the_dashboard_scale(G):
+    # the sliders show imdb out of 10 and tomato out of 100, the table stores both in [0, 1]
+    query = get_query(G, [2000, 2015], None, None, 6, 50, 2, 'yes')
+    table = G.graph['table']
+    expected = table[
+        (table['is_instance'] == 'movie') & table['Year'].between(2000, 2015) & (table['imdb'] >= 0.6)
+        & (table['tomato'] >= 0.5) & (table['Scare Rating'] >= 2) & (table['Netflix (US)'] == 'Yes')
+    ]
+    kept = get_kept_movies(G, query)
+    assert kept == {G.graph['nodes'][row] for row in expected.index}
+    assert 0 < len(kept) < len(table)
+
+
+def test_command_line_filters_build_the_same_query(G):
+    assert get_query(G, (None, None), None, None, None, None, None, None) is None
+    assert get_query(G, (2000, 2015), None, None, 6, 50, 2, True) == get_query(G, [2000, 2015], None, None, 6, 50, 2, 'yes')
+    assert get_query(G, (2000, None), None, None, None, None, None, False) == (('Year', (2000, None)), ('netflix', False))
@@ -0,0 +1,68 @@
+import collections
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src import reload
+from src.synthetic import get_synthetic_details
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    monkeypatch.setattr(reload, 'RELOAD_INTERVAL', 0)
+    monkeypatch.setattr(reload, 'graphs', collections.OrderedDict())
+    monkeypatch.setattr(reload, 'reload_state', {'stamp': None, 'checked': 0.0, 'reloading': False})
+    return tmp_path
+
+
+def write_details(n_movies):
+    json.dump(get_synthetic_details(n_movies), open('data/data_details.json', 'w'))
+
+
+def get_movie_count(G):
+    return (G.graph['table']['is_instance'] == 'movie').sum()
+
+
+def wait_for_live_graph(n_movies, warmed, timeout=60):
+    # requests keep checking for the change while the background thread builds and warms the graph
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        G = reload.get_live_graph(warm=warmed.append)
+        if get_movie_count(G) == n_movies and not reload.reload_state['reloading']:
+            return G
+        time.sleep(0.05)
+    raise AssertionError(f'no graph of {n_movies} movies went live')
+
+
+def test_reload_swaps_pins_and_evicts_versions(data_dir):
+    warmed = []
+    write_details(20)
+    first = reload.get_live_graph(warm=warmed.append)
+    assert warmed == [first]
+
+    write_details(30)
+    second = wait_for_live_graph(30, warmed)
+    assert second is not first and second in warmed
+    # pages rendered from the first version keep being served it
+    assert reload.get_live_graph(first.graph['version']) is first
+
+    write_details(40)
+    third = wait_for_live_graph(40, warmed)
+    assert list(reload.graphs) == [second.graph['version'], third.graph['version']]
+    assert reload.get_live_graph(second.graph['version']) is second
+    # beyond KEEP_GRAPHS the oldest version is dropped and its pages get the live graph
+    assert reload.get_live_graph(first.graph['version']) is third
+    assert reload.read_artifact_version() == third.graph['version']
+
+
+def test_one_worker_builds_a_stale_artifact(data_dir, monkeypatch):
+    write_details(20)
+    builds = []
+    save_graph_artifact = reload.save_graph_artifact
+    monkeypatch.setattr(reload, 'save_graph_artifact', lambda G: builds.append(G) or save_graph_artifact(G))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        loaded = list(executor.map(lambda _: reload.get_published_graph(), range(4)))
+    assert len(builds) == 1
+    assert {G.graph['version'] for G in loaded} == {builds[0].graph['version']}
@@ -0,0 +1,142 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.graph import get_store_batches, load_details
+from src.page_store import get_page_path, load_page_index, store_page
+from src.scrape import add_jump_ratings, get_detailed_data, get_incremental_data, get_links, get_main_page, get_main_table, get_site, map_bounded, scrape_to_store
+from src.storage import SCHEMAS, load_table, write_store
+
+PAGES = ['alpha-2001', 'beta-2005', 'gamma-2010']
+
+
+def scrape_links(site):
+    main_url = site['url'] + '/full-movie-list/'
+    soup = get_main_page(main_url)
+    links = get_links(soup, get_site(main_url))
+    return soup, links
+
+
+def strip_names(data_details):
+    return {movie.strip(): details for movie, details in data_details.items()}
+
+
+def test_links_move_onto_local_site(site):
+    soup, links = scrape_links(site)
+    assert links == [f"{site['url']}/jump-scares-in-{page}/" for page in PAGES]
+    assert len(links) == len(get_main_table(soup))
+
+
+def test_detailed_data_from_local_site(site):
+    _, links = scrape_links(site)
+    data_details = strip_names(get_detailed_data(links, workers=2))
+    assert sorted(data_details) == ['Alpha (2001)', 'Beta (2005)', 'Gamma (2010)']
+    alpha = data_details['Alpha (2001)']
+    assert alpha['link'] == links[0]
+    assert alpha['Director'] == 'Ann Director'
+    assert (alpha['imdb'], alpha['tomato']) == ('6.4/10', '55%')
+    assert alpha['Tags'] == ['Zombies', 'Survival']
+    assert alpha['scare'] == {
+        '5:13': {'desc': 'A door slams.', 'major': True},
+        '19:58': {'desc': 'A cat jumps out.', 'major': False},
+        '1:02:03': {'desc': 'A phone rings.', 'major': False}
+    }
+
+
+def test_failed_pages_do_not_stop_the_scrape(site, capsys):
+    _, links = scrape_links(site)
+    missing = site['url'] + '/jump-scares-in-missing-1999/'
+    data_details = strip_names(get_detailed_data(links[:1] + [missing] + links[1:], workers=2))
+    assert sorted(data_details) == ['Alpha (2001)', 'Beta (2005)', 'Gamma (2010)']
+    assert '1 pages could not be fetched' in capsys.readouterr().out
+
+
+def test_page_index_survives_a_failed_scrape(site, monkeypatch):
+    _, links = scrape_links(site)
+    stored = []
+
+    def store_then_fail(page_index, link, res):
+        if stored:
+            raise RuntimeError('disk full')
+        stored.append(link)
+        return store_page(page_index, link, res)
+
+    monkeypatch.setattr('src.scrape.store_page', store_then_fail)
+    with pytest.raises(RuntimeError):
+        get_detailed_data(links, workers=1)
+    assert list(load_page_index()) == links[:1]
+
+
+def test_missing_stored_page_is_fetched_again(site):
+    _, links = scrape_links(site)
+    data_details = get_detailed_data(links)
+    os.remove(get_page_path(links[0]))
+    assert get_detailed_data(links) == data_details
+    assert os.path.exists(get_page_path(links[0]))
+
+
+def test_incremental_scrape_merges_new_and_changed_pages(site):
+    _, links = scrape_links(site)
+    data_details = get_detailed_data(links[:2])
+    beta_path = os.path.join(site['root'], 'jump-scares-in-beta-2005', 'index.html')
+    content = open(beta_path).read().replace('A test movie about a boat.', 'A test movie about a ship.')
+    open(beta_path, 'w').write(content)
+    os.utime(beta_path, (time.time() + 10, time.time() + 10))
+
+    added = strip_names(get_incremental_data(links[1:], data_details))
+    assert sorted(added) == ['Beta (2005)', 'Gamma (2010)']
+    assert added['Beta (2005)']['Synopsis'] == 'A test movie about a boat.'
+
+    rechecked = strip_names(get_incremental_data(links, data_details, recheck=True))
+    assert sorted(rechecked) == ['Alpha (2001)', 'Beta (2005)', 'Gamma (2010)']
+    assert rechecked['Beta (2005)']['Synopsis'] == 'A test movie about a ship.'
+    assert rechecked['Alpha (2001)'] == strip_names(data_details)['Alpha (2001)']
+
+
+def test_scrape_streams_into_the_store(site):
+    soup, links = scrape_links(site)
+    jumpscares = get_main_table(soup)
+    jumpscares['link'] = links
+    scrape_to_store(links, jumpscares, workers=2, batch_size=2)
+    details = load_details()
+    assert details == add_jump_ratings(get_detailed_data(links), jumpscares)
+    streamed = {name: load_table(name) for name in SCHEMAS}
+    assert len(streamed['movies']) == 3
+
+    # the streamed store holds the same rows as converting the saved details in one go
+    write_store(get_store_batches(details, 100))
+    for name, table in streamed.items():
+        converted = load_table(name)
+        assert sorted(map(str, table.values.tolist())) == sorted(map(str, converted.values.tolist()))
+
+
+def test_failed_pages_keep_their_movies(site, capsys):
+    soup, links = scrape_links(site)
+    jumpscares = get_main_table(soup)
+    jumpscares['link'] = links
+    scrape_to_store(links, jumpscares)
+    before = load_details()
+
+    # beta is read from data/pages, gamma has no stored copy and keeps its previous details
+    for page in PAGES[1:]:
+        shutil.rmtree(os.path.join(site['root'], f'jump-scares-in-{page}'))
+    os.remove(get_page_path(links[2]))
+    scrape_to_store(links, jumpscares, workers=2, batch_size=2)
+    assert '2 pages could not be fetched' in capsys.readouterr().out
+    assert load_details() == before
+    assert len(load_table('movies')) == 3
+
+
+def test_fetches_run_a_bounded_distance_ahead():
+    submitted = []
+
+    def record(item):
+        submitted.append(item)
+        return item
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = map_bounded(executor, record, range(100), 4)
+        assert next(results) == 0
+        assert len(submitted) <= 4
+        assert list(results) == list(range(1, 100))
@@ -0,0 +1,43 @@
+import numpy as np
+from src.similarity import SIMILARITY_FIELDS, get_similar_movies
+
+
+def get_pairwise_scores(G, link_weight=0.5):
+    # every pair of movies sharing a director or tag, scored from their link sets and from the
+    # fields standardised with pandas
+    table = G.graph['table']
+    nodes = G.graph['nodes']
+    movies = [node for node, is_movie in zip(nodes, table['is_instance'] == 'movie') if is_movie]
+    values = table.loc[table['is_instance'] == 'movie', SIMILARITY_FIELDS]
+    features = ((values - values.mean()) / values.std(ddof=0)).fillna(0).values
+    features /= np.where(np.linalg.norm(features, axis=1) > 0, np.linalg.norm(features, axis=1), 1)[:, None]
+    links = {movie: set(G.adj[movie]) for movie in movies}
+    scores = {}
+    for i, movie in enumerate(movies):
+        scores[movie] = {}
+        for j, other in enumerate(movies):
+            shared = len(links[movie] & links[other])
+            if other == movie or not shared:
+                continue
+            jaccard = shared / len(links[movie] | links[other])
+            scores[movie][other] = link_weight * jaccard + (1 - link_weight) * (features[i] @ features[j] + 1) / 2
+    return scores
+
+
+def test_similar_movies_match_pairwise_scores(G):
+    k = G.graph['similar_ids'].shape[1]
+    pairwise = get_pairwise_scores(G)
+    assert any(len(scores) > k for scores in pairwise.values())
+    for movie, scores in pairwise.items():
+        similar = get_similar_movies(G, movie)
+        expected = sorted(scores.values(), reverse=True)[:k]
+        # ties may be ordered either way, so the scores are compared in order and the movies by score
+        np.testing.assert_allclose([score for _, score in similar], expected, rtol=1e-5, err_msg=movie)
+        for other, score in similar:
+            assert np.isclose(scores[other], score, rtol=1e-5), (movie, other)
+
+
+def test_people_and_tags_have_no_similar_movies(G):
+    for node, data in G.nodes(data=True):
+        if data['is_instance'] != 'movie':
+            assert get_similar_movies(G, node) == []
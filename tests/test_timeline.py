@@ -0,0 +1,43 @@
+import collections
+import numpy as np
+import pandas as pd
+from src.timeline import TIMELINE_FIELDS, get_timeline, get_timeline_stats
+
+
+def get_movie_stats(seconds):
+    # one movie's stats the straightforward way, from its sorted scare times
+    if not len(seconds):
+        return [np.nan] * len(TIMELINE_FIELDS)
+    gaps = np.diff(seconds) / 60
+    minutes = collections.Counter(int(second // 60) for second in seconds)
+    scariest_minute = min(minutes, key=lambda minute: (-minutes[minute], minute))
+    return [seconds[0] / 60, gaps.mean() if len(gaps) else np.nan, gaps.min() if len(gaps) else np.nan,
+            scariest_minute, minutes[scariest_minute]]
+
+
+def check_stats(timeline):
+    offsets = timeline['offsets']
+    stats = get_timeline_stats(timeline)
+    assert list(stats.index) == timeline['movies']
+    for i, movie in enumerate(timeline['movies']):
+        expected = get_movie_stats(timeline['seconds'][offsets[i]:offsets[i + 1]])
+        np.testing.assert_allclose(stats.loc[movie, TIMELINE_FIELDS].values.astype(float), expected, err_msg=movie)
+
+
+def test_timeline_stats_match_a_loop(G):
+    timeline = G.graph['timeline']
+    assert len(timeline['seconds'])
+    check_stats(timeline)
+
+
+def test_timeline_skips_unknown_movies_and_missing_times():
+    scares = pd.DataFrame({
+        'movie': ['b', 'a', 'b', 'c', 'b', 'x', 'a', 'b'],
+        'seconds': [130, 610, 70, np.nan, 125, 5, 600, 3]
+    })
+    timeline = get_timeline(scares, ['a', 'b', 'c', 'd'])
+    np.testing.assert_array_equal(timeline['seconds'], [600, 610, 3, 70, 125, 130])
+    np.testing.assert_array_equal(timeline['offsets'], [0, 2, 6, 6, 6])
+    check_stats(timeline)
+    # b has one scare in each of minutes 0 and 1 and two in minute 2
+    assert get_timeline_stats(timeline).loc['b', ['Scariest Minute', 'Scariest Minute Scares']].tolist() == [2, 2]
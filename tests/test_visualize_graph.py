@@ -0,0 +1,74 @@
+import gc
+import types
+import weakref
+import numpy as np
+import pandas as pd
+from src.graph import build_graph
+from src.synthetic import get_synthetic_details
+from src.visualize_graph import LOD_GRID, LOD_MAX_BUNDLES, LOD_NODE_LIMIT, get_algo_positions, get_bundled_edges, get_figure_base, get_geometry, get_lod_geometry, get_selection
+
+
+def get_random_graph(n_nodes, n_edges, seed=0):
+    rng = np.random.RandomState(seed)
+    edges = np.sort(rng.randint(0, n_nodes, (n_edges, 2)), axis=1)
+    edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(edges.ravel(), minlength=n_nodes))])
+    G = types.SimpleNamespace(graph={'edges': edges, 'indptr': indptr, 'edge_connections': np.full(len(edges), 'tag'),
+                                     'table': pd.DataFrame({'is_instance': ['tag'] * n_nodes})})
+    return G, rng.rand(n_nodes, 2)
+
+
+def test_lod_clusters_the_nodes_it_does_not_draw():
+    n_nodes = LOD_NODE_LIMIT * 2
+    G, positions = get_random_graph(n_nodes, n_nodes * 3)
+    geometry = get_lod_geometry(G, positions)
+    assert len(geometry['nodes']) == LOD_NODE_LIMIT // 2
+    degrees = np.diff(G.graph['indptr'])
+    assert degrees[geometry['nodes']].min() >= np.delete(degrees, geometry['nodes']).max()
+    clustered = sum(int(text.split()[0]) for text in geometry['clusters']['text'])
+    assert clustered + len(geometry['nodes']) == n_nodes
+    assert len(geometry['edge_x']) <= 3 * LOD_MAX_BUNDLES
+
+
+def test_lod_draws_every_node_in_a_small_viewport():
+    G, positions = get_random_graph(LOD_NODE_LIMIT * 2, LOD_NODE_LIMIT * 6)
+    geometry = get_lod_geometry(G, positions, (0.1, 0.3, 0.2, 0.4))
+    x, y = positions[:, 0], positions[:, 1]
+    expected = np.flatnonzero((x >= 0.1) & (x <= 0.3) & (y >= 0.2) & (y <= 0.4))
+    np.testing.assert_array_equal(geometry['nodes'], expected)
+    assert 'clusters' not in geometry
+
+
+def test_edges_between_two_cells_become_one_bundle():
+    cells = np.array([0, 0, 1, 1, -1])
+    centroids = np.zeros((LOD_GRID ** 2, 2))
+    centroids[1] = [1, 2]
+    edges = np.array([[0, 2], [1, 3], [0, 1], [3, 4]])
+    edge_x, edge_y = get_bundled_edges(edges, cells, centroids)
+    np.testing.assert_array_equal(edge_x, [0, 1, np.nan])
+    np.testing.assert_array_equal(edge_y, [0, 2, np.nan])
+
+
+def test_layout_is_freed_with_its_graph(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    G = build_graph(get_synthetic_details(30), 'synthetic')
+    assert get_algo_positions(G) is get_algo_positions(G)
+    graph_ref = weakref.ref(G)
+    del G
+    gc.collect()
+    assert graph_ref() is None
+
+
+def test_edges_carry_their_connection(G, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    labels = get_figure_base(G)['connection_labels']
+    geometry = get_geometry(G, (None, None))
+    edges = G.graph['edges']
+    assert len(geometry['edge_connections']) * 3 == len(geometry['edge_x']) == 3 * len(edges)
+    assert [labels[code] for code in geometry['edge_connections']] == list(G.graph['edge_connections'])
+
+    node = max(G.graph['nodes'], key=lambda node: len(G.adj[node]))
+    selection = get_selection(G, node)
+    nodes = G.graph['nodes']
+    expected = [G.edges[nodes[a], nodes[b]]['connection'] for a, b in selection['edges']]
+    assert [labels[code] for code in selection['connections']] == expected